@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from table_lock import TableLock, atomic_write
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _process_alive(pid):
+    """Whether a process exists; assumed so where it can't be checked"""
+    if not pid:
+        return False
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class BackgroundJob:
+    """Runs a long task on a background thread, never twice at once
+
+    start() returns a Future right away. While a run is queued or in
+    progress, every caller gets that run's Future instead of starting
+    another (single flight). A lock file extends this to other processes
+    sharing the data directory: if one of them is already running the job,
+    the run is skipped and resolves to None.
+
+    With an interval the job also runs on its own, `interval` seconds after
+    the previous run finished. The outcome of each run is saved to
+    state_path, so it is shown (and the schedule kept) across restarts.
+
+    func is called as func(progress) and returns a JSON-serializable
+    result, or None when it failed. It may call progress(step, done, total)
+    to report how far along it is.
+    """
+
+    def __init__(self, name, func, state_path, lock_path, interval=0):
+        self.name = name
+        self.func = func
+        self.state_path = state_path
+        self.interval = float(interval or 0)
+        self._file_lock = TableLock(lock_path)
+        self._cond = threading.Condition()
+        self._pending = None
+        self._running = None
+        self._progress = None
+        self._stopping = False
+        # Runs skipped because another process had the lock count too, so
+        # the schedule doesn't spin while that run is still going. A job that
+        # has never run waits one interval; an overdue one runs right away.
+        self._last_attempt = 0 if self._load_state().get('last') else time.time()
+        self._thread = None
+        if self.interval > 0:
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def start(self, trigger='manual'):
+        """Queue a run, or return the Future of the run that is already queued or running"""
+        with self._cond:
+            if self._running is not None:
+                return self._running['future']
+            if self._pending is None:
+                self._pending = {'trigger': trigger, 'future': Future()}
+                self._ensure_thread()
+                self._cond.notify_all()
+            return self._pending['future']
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable job state %s: %s", self.state_path, e)
+            return {}
+
+    def _save_state(self, **changes):
+        state = {**self._load_state(), **changes}
+        atomic_write(self.state_path, lambda f: json.dump(state, f, indent=2))
+
+    def _next_due(self):
+        """Epoch seconds of the next scheduled run, or None without a schedule"""
+        if self.interval <= 0:
+            return None
+        last = self._load_state().get('last')
+        finished = datetime.fromisoformat(last['finished']).timestamp() if last else 0
+        return max(finished, self._last_attempt) + self.interval
+
+    def _wait_for_work(self):
+        """Block until a run is requested or due; None once stopping"""
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                if self._pending is not None:
+                    self._running, self._pending = self._pending, None
+                    self._last_attempt = time.time()
+                    return self._running
+                due = self._next_due()
+                if due is not None and time.time() >= due:
+                    self._running = {'trigger': 'scheduled', 'future': Future()}
+                    self._last_attempt = time.time()
+                    return self._running
+                self._cond.wait(None if due is None else max(due - time.time(), 0.1))
+
+    def _run(self):
+        while True:
+            run = self._wait_for_work()
+            if run is None:
+                return
+            result = None
+            try:
+                result = self._execute(run['trigger'])
+            finally:
+                with self._cond:
+                    self._running = None
+                    self._progress = None
+                    self._cond.notify_all()
+                run['future'].set_result(result)
+
+    def _execute(self, trigger):
+        if not self._file_lock.acquire(blocking=False):
+            logger.info("%s is already running in another process; skipping", self.name)
+            return None
+        try:
+            started = datetime.now()
+            self._save_state(current={'trigger': trigger, 'started': started.isoformat(timespec='seconds'),
+                                      'pid': os.getpid()})
+            logger.info("Starting %s (%s)", self.name, trigger)
+            result, error = None, None
+            try:
+                result = self.func(self.report_progress)
+                if result is None:
+                    error = "Failed; see the log for details"
+            except Exception as e:
+                logger.error("Error in %s: %s", self.name, e)
+                error = str(e)
+            finished = datetime.now()
+            self._save_state(current=None, last={
+                'trigger': trigger,
+                'started': started.isoformat(timespec='seconds'),
+                'finished': finished.isoformat(timespec='seconds'),
+                'duration': round((finished - started).total_seconds(), 2),
+                'ok': error is None,
+                'error': error,
+                'result': result,
+            })
+            logger.info("Finished %s in %.1fs", self.name, (finished - started).total_seconds())
+            return result
+        finally:
+            self._file_lock.release()
+
+    def report_progress(self, step, done=None, total=None):
+        """Record the current step of the running job"""
+        with self._cond:
+            self._progress = {'step': step, 'done': done, 'total': total}
+
+    def status(self):
+        """Get the running job (in any process), its progress and the last persisted result"""
+        state = self._load_state()
+        with self._cond:
+            current = state.get('current')
+            if self._running is not None:
+                current = {**(current or {}), 'trigger': self._running['trigger']}
+            elif self._pending is not None:
+                current = {'trigger': self._pending['trigger'], 'started': None}
+            elif current and (current.get('pid') == os.getpid() or not _process_alive(current.get('pid'))):
+                # Left behind by a run of ours that already ended, or by a process that died
+                current = None
+            progress = dict(self._progress) if self._progress else None
+        next_due = self._next_due()
+        return {
+            'running': current is not None,
+            'current': current,
+            'progress': progress,
+            'last': state.get('last'),
+            'next_run': datetime.fromtimestamp(next_due) if next_due else None,
+        }
+
+    def stop(self, timeout=30):
+        """Stop scheduling new runs and wait for a running one to finish"""
+        with self._cond:
+            self._stopping = True
+            if self._pending is not None:
+                self._pending['future'].set_result(None)
+                self._pending = None
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
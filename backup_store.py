@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from table_lock import TableLock, atomic_write
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Default retention: the last N snapshots, plus the newest snapshot of
+# each of the last N hours/days/weeks
+KEEP_LAST = int(os.getenv('FC_BACKUP_KEEP_LAST', 5))
+KEEP_HOURLY = int(os.getenv('FC_BACKUP_KEEP_HOURLY', 24))
+KEEP_DAILY = int(os.getenv('FC_BACKUP_KEEP_DAILY', 7))
+KEEP_WEEKLY = int(os.getenv('FC_BACKUP_KEEP_WEEKLY', 8))
+
+SNAPSHOT_TIME_FORMAT = '%Y%m%d_%H%M%S'
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BackupStore:
+    """Content-addressed backup snapshots
+
+    File contents are stored once under objects/<sha256>; each snapshot is
+    a small JSON manifest in snapshots/ mapping file names to hashes, so an
+    unchanged table costs nothing to back up again. Restores copy objects
+    back out (never hard-link them, since live CSVs are appended in place).
+
+    Creating, restoring and pruning snapshots hold one store lock (shared
+    with other processes), so garbage collection never deletes objects a
+    snapshot that is still being written needs.
+    """
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, "objects")
+        self.snapshots_dir = os.path.join(backup_dir, "snapshots")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        self.lock = TableLock(os.path.join(backup_dir, "backups.lock"))
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def _manifest_path(self, name):
+        return os.path.join(self.snapshots_dir, f"{name}.json")
+
+    def _store_object(self, path):
+        sha = file_sha256(path)
+        object_path = self._object_path(sha)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+        return sha, os.path.getsize(object_path)
+
+    def create(self, source_dir, file_names, created=None, schema_version=None):
+        """Snapshot the given files of source_dir and return the snapshot name
+
+        schema_version is recorded in the manifest so a restore can migrate
+        the files; it's None for backups older than versioned schemas.
+        """
+        with self.lock:
+            return self._create(source_dir, file_names, created, schema_version)
+
+    def _create(self, source_dir, file_names, created, schema_version):
+        created = created or datetime.now()
+        name = created.strftime(SNAPSHOT_TIME_FORMAT)
+        suffix = 1
+        while os.path.exists(self._manifest_path(name)):
+            name = f"{created.strftime(SNAPSHOT_TIME_FORMAT)}_{suffix}"
+            suffix += 1
+
+        files = {}
+        for file_name in file_names:
+            path = os.path.join(source_dir, file_name)
+            if os.path.exists(path):
+                sha, size = self._store_object(path)
+                files[file_name] = {'sha256': sha, 'size': size}
+
+        manifest = {'name': name, 'created': created.isoformat(timespec='seconds'),
+                    'schema_version': schema_version, 'files': files}
+        atomic_write(self._manifest_path(name), lambda f: json.dump(manifest, f, indent=2))
+        return name
+
+    def snapshot(self, name):
+        """Return a snapshot's manifest, or None if it doesn't exist"""
+        try:
+            with open(self._manifest_path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_snapshots(self):
+        """Return every snapshot manifest, oldest first"""
+        manifests = []
+        for file_name in os.listdir(self.snapshots_dir):
+            if file_name.endswith('.json'):
+                manifest = self.snapshot(file_name[:-len('.json')])
+                if manifest is not None:
+                    manifests.append(manifest)
+        return sorted(manifests, key=lambda manifest: (manifest['created'], manifest['name']))
+
+    def latest(self):
+        """Return the name of the newest snapshot, or None"""
+        snapshots = self.list_snapshots()
+        return snapshots[-1]['name'] if snapshots else None
+
+    def verify(self, name):
+        """Check a snapshot's objects against its checksums and return the problems found"""
+        manifest = self.snapshot(name)
+        if manifest is None:
+            return [f"snapshot {name} does not exist"]
+        problems = []
+        for file_name, entry in manifest['files'].items():
+            object_path = self._object_path(entry['sha256'])
+            if not os.path.exists(object_path):
+                problems.append(f"{file_name}: object missing")
+            elif file_sha256(object_path) != entry['sha256']:
+                problems.append(f"{file_name}: checksum mismatch")
+        return problems
+
+    def restore(self, name, target_dir):
+        """Copy a snapshot's files into target_dir after verifying every checksum
+
+        Nothing is touched unless the whole snapshot verifies. Returns the
+        restored file names.
+        """
+        with self.lock:
+            return self._restore(name, target_dir)
+
+    def _restore(self, name, target_dir):
+        problems = self.verify(name)
+        if problems:
+            raise ValueError(f"Backup {name} failed verification: {'; '.join(problems)}")
+        files = self.snapshot(name)['files']
+        staged = []
+        try:
+            for file_name, entry in files.items():
+                tmp_path = os.path.join(target_dir, f"{file_name}.restore")
+                shutil.copyfile(self._object_path(entry['sha256']), tmp_path)
+                staged.append((tmp_path, os.path.join(target_dir, file_name)))
+        except BaseException:
+            for tmp_path, _ in staged:
+                os.remove(tmp_path)
+            raise
+        for tmp_path, path in staged:
+            os.replace(tmp_path, path)
+        return sorted(files)
+
+    def prune(self, last=KEEP_LAST, hourly=KEEP_HOURLY, daily=KEEP_DAILY, weekly=KEEP_WEEKLY):
+        """Apply the retention policy, then delete objects no snapshot references
+
+        Keeps the `last` newest snapshots, plus the newest snapshot in each of
+        the last `hourly` hours, `daily` days and `weekly` ISO weeks that have
+        one. Returns the names of the removed snapshots.
+        """
+        with self.lock:
+            return self._prune(last, hourly, daily, weekly)
+
+    def _prune(self, last, hourly, daily, weekly):
+        snapshots = list(reversed(self.list_snapshots()))
+        keep = {manifest['name'] for manifest in snapshots[:max(last, 1)]}
+        buckets = (
+            (hourly, lambda created: created.strftime('%Y-%m-%d %H')),
+            (daily, lambda created: created.date()),
+            (weekly, lambda created: created.isocalendar()[:2]),
+        )
+        for count, bucket in buckets:
+            seen = set()
+            for manifest in snapshots:
+                key = bucket(datetime.fromisoformat(manifest['created']))
+                if key in seen:
+                    continue
+                if len(seen) >= count:
+                    break
+                seen.add(key)
+                keep.add(manifest['name'])
+
+        removed = [manifest['name'] for manifest in snapshots if manifest['name'] not in keep]
+        for name in removed:
+            os.remove(self._manifest_path(name))
+        self._collect_garbage()
+        if removed:
+            logger.info("Pruned %d backup snapshot(s)", len(removed))
+        return removed
+
+    def _collect_garbage(self):
+        referenced = {
+            entry['sha256'] for manifest in self.list_snapshots() for entry in manifest['files'].values()
+        }
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for sha in os.listdir(prefix_dir):
+                if sha not in referenced:
+                    os.remove(os.path.join(prefix_dir, sha))
+
+    def adopt_legacy_backups(self, file_names):
+        """Convert old backups/backup_<timestamp> folders into snapshots"""
+        with self.lock:
+            self._adopt_legacy_backups(file_names)
+
+    def _adopt_legacy_backups(self, file_names):
+        for folder in sorted(os.listdir(self.backup_dir)):
+            path = os.path.join(self.backup_dir, folder)
+            if not (folder.startswith('backup_') and os.path.isdir(path)):
+                continue
+            try:
+                created = datetime.strptime(folder[len('backup_'):], SNAPSHOT_TIME_FORMAT)
+            except ValueError:
+                continue
+            self.create(path, file_names, created=created)
+            shutil.rmtree(path)
+            logger.info("Converted legacy backup %s into a snapshot", folder)
@@ -0,0 +1,128 @@
+import hashlib
+import io
+import json
+import zipfile
+from datetime import datetime
+import pandas as pd
+from storage import TABLE_COLUMNS
+from migrations import infer_schema_version, latest_version
+from table_schema import apply_schema
+
+MANIFEST_NAME = "manifest.json"
+ARCHIVE_FORMAT = 1
+
+# Refuse archives that would inflate to more than this
+MAX_ARCHIVE_BYTES = 512 * 1024 * 1024
+
+# Columns an imported table must have; migrations add any others. A tuple
+# accepts any one of its columns (current name first, then older ones).
+REQUIRED_COLUMNS = {
+    'members': ['name'],
+    'donations': [('member_id', 'member_name'), 'amount', 'date'],
+    'expenses': ['date', 'amount', 'category'],
+    'bids': [('member_id', 'member_name'), 'bid_number'],
+}
+
+
+class ArchiveError(ValueError):
+    """An import archive is malformed or doesn't match its manifest"""
+
+
+def build_archive(tables, schema_version, **meta):
+    """Zip table CSVs and a manifest into an in-memory DEFLATE archive
+
+    tables maps each table name to (csv bytes, row count). Returns the
+    archive as bytes.
+    """
+    manifest = {
+        'format': ARCHIVE_FORMAT,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'schema_version': schema_version,
+        'files': {},
+        **meta
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zipf:
+        for table, (data, rows) in tables.items():
+            file_name = f"{table}.csv"
+            zipf.writestr(file_name, data)
+            manifest['files'][file_name] = {
+                'rows': rows,
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest()
+            }
+        zipf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+    return buffer.getvalue()
+
+
+def _parse_table(table, data):
+    try:
+        df = pd.read_csv(io.BytesIO(data))
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame(columns=TABLE_COLUMNS[table])
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ArchiveError(f"{table}.csv is not a valid CSV file: {e}")
+
+    missing = [
+        col if isinstance(col, str) else col[0]
+        for col in REQUIRED_COLUMNS[table]
+        if not set([col] if isinstance(col, str) else col) & set(df.columns)
+    ]
+    if missing:
+        raise ArchiveError(f"{table}.csv is missing columns: {', '.join(missing)}")
+    try:
+        df = apply_schema(table, df, strict=True)
+    except ValueError as e:
+        raise ArchiveError(f"{table}.csv has invalid values: {e}")
+    if 'id' in df.columns and df['id'].dropna().duplicated().any():
+        raise ArchiveError(f"{table}.csv has duplicate record ids")
+    return df
+
+
+def read_archive(source):
+    """Validate and parse an export archive without touching any data files
+
+    source is a path or a file-like object. Returns ({table: DataFrame},
+    schema version). Raises ArchiveError if the archive is incomplete,
+    corrupt, doesn't match its manifest or is from a newer schema.
+    """
+    try:
+        zipf = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Not a zip file: {e}")
+
+    with zipf:
+        names = set(zipf.namelist())
+        missing = [f"{table}.csv" for table in TABLE_COLUMNS if f"{table}.csv" not in names]
+        if missing:
+            raise ArchiveError(f"Zip file missing required data files: {', '.join(missing)}")
+        if sum(info.file_size for info in zipf.infolist()) > MAX_ARCHIVE_BYTES:
+            raise ArchiveError("Zip file is too large to import")
+
+        manifest = None
+        if MANIFEST_NAME in names:
+            try:
+                manifest = json.loads(zipf.read(MANIFEST_NAME))
+            except ValueError as e:
+                raise ArchiveError(f"Unreadable manifest: {e}")
+            if manifest.get('format', 0) > ARCHIVE_FORMAT:
+                raise ArchiveError("Archive was written by a newer version of this app")
+
+        frames = {}
+        for table in TABLE_COLUMNS:
+            file_name = f"{table}.csv"
+            try:
+                data = zipf.read(file_name)
+            except zipfile.BadZipFile as e:
+                raise ArchiveError(f"{file_name} is corrupt: {e}")
+            expected = manifest['files'].get(file_name) if manifest else None
+            if expected and hashlib.sha256(data).hexdigest() != expected['sha256']:
+                raise ArchiveError(f"{file_name} does not match its checksum")
+            frames[table] = _parse_table(table, data)
+            if expected and len(frames[table]) != expected['rows']:
+                raise ArchiveError(f"{file_name} has {len(frames[table])} rows, expected {expected['rows']}")
+
+    version = manifest['schema_version'] if manifest else infer_schema_version(frames)
+    if version > latest_version():
+        raise ArchiveError(f"Archive schema version {version} is newer than this app supports")
+    return frames, version
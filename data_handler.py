@@ -1,265 +1,511 @@
 import pandas as pd
 import os
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from lodestone_scraper import LodestoneScraper
-import shutil
-import zipfile
-from git_sync import GitSync
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from git_sync import GitSync, SyncWorker
+from storage import TABLE_COLUMNS, open_storage
+from migrations import run_migrations, current_schema_version, stored_schema_version, write_schema_version
+from record_ids import new_record_id
+from ledger import (TotalsLedger, net_expense_amount, EXPENSE_ACTIVE, EXPENSE_RETURNED,
+                    EXPENSE_PARTIALLY_RETURNED)
+from log_config import get_logger
+from backup_store import BackupStore
+from background_job import BackgroundJob
+from data_archive import build_archive, read_archive
+
+logger = get_logger(__name__)
+
+# The files that make up an FC's data
+DATA_FILES = [f"{table}.csv" for table in TABLE_COLUMNS]
+
+DEFAULT_FC_ID = "9228157111459014466"
+
+# Most FCs kept open at once; the least recently used one is closed beyond that
+MAX_OPEN_FCS = int(os.getenv('FC_MAX_OPEN', 8))
+
+# Seconds between scheduled Lodestone member syncs; 0 turns the schedule off
+MEMBER_SYNC_INTERVAL = float(os.getenv('FC_MEMBER_SYNC_INTERVAL', 6 * 3600))
+
+
+def hosted_fcs():
+    """FCs served by this deployment as {fc_id: display name}
+
+    FC_IDS lists them as comma-separated `id` or `id=Name` entries. The
+    first one is the default.
+    """
+    fcs = {}
+    for entry in os.getenv('FC_IDS', f"{DEFAULT_FC_ID}=Lotus").split(','):
+        fc_id, _, name = entry.partition('=')
+        if fc_id.strip():
+            fcs[fc_id.strip()] = name.strip() or f"FC {fc_id.strip()}"
+    return fcs or {DEFAULT_FC_ID: "Lotus"}
+
+
+def fc_data_dir(fc_id):
+    """Data directory of an FC
+
+    The default FC keeps the original data/ folder; every other FC gets its
+    own folder (and git repository) under data/fcs/.
+    """
+    if not re.fullmatch(r'\d+', str(fc_id)):
+        raise ValueError(f"Invalid Free Company id: {fc_id!r}")
+    data_dir = os.path.join(os.environ.get('REPL_HOME', ''), 'data')
+    if str(fc_id) == DEFAULT_FC_ID:
+        return data_dir
+    return os.path.join(data_dir, 'fcs', str(fc_id))
+
+
+def _member_keys(df):
+    """(name, world) of each member row, the identity used to match roster entries"""
+    worlds = df['world'].astype(object).where(df['world'].notna(), None)
+    return pd.Series(list(zip(df['name'], worlds)), index=df.index, dtype=object)
 
 class DataManager:
-    def __init__(self, fc_id="9228157111459014466"):
-        # Use a persistent directory path for Replit
-        self.data_dir = os.path.join(os.environ.get('REPL_HOME', ''), 'data')
+    # fc_id -> open DataManager, least recently used first
+    _instances = OrderedDict()
+    _instances_lock = threading.Lock()
+    # fc_id -> lock held while that FC's DataManager is being built
+    _building = {}
+    # fc_id -> event set once that FC's evicted DataManager has finished closing
+    _closing = {}
+
+    def __init__(self, fc_id=DEFAULT_FC_ID):
+        # Use a persistent directory path for Replit, one folder per FC
+        self.fc_id = fc_id
+        self.data_dir = fc_data_dir(fc_id)
+        # Callers holding this manager through acquire(); only unheld ones are evicted
+        self._holders = 0
         self.donations_path = os.path.join(self.data_dir, "donations.csv")
         self.members_path = os.path.join(self.data_dir, "members.csv")
         self.expenses_path = os.path.join(self.data_dir, "expenses.csv")
         self.bids_path = os.path.join(self.data_dir, "bids.csv")
         self.expense_categories = ['Housing', 'Giveaways', 'Events', 'Crafting', 'Other']
+        # Held for a whole refresh; refresh_async only needs the short-lived
+        # future lock, so it never waits for a pull
+        self._refresh_lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"refresh-{fc_id}")
+        self._refresh_future = None
+        self._refresh_future_lock = threading.Lock()
+        # member -> donation summary, valid for one version of the donations table
+        self._donation_index = None
+        self._donation_index_version = None
+        self._donation_index_lock = threading.RLock()
 
         # Ensure data directory exists with proper permissions
         os.makedirs(self.data_dir, mode=0o755, exist_ok=True)
 
-        # Create backup directory
-        backup_dir = os.path.join(self.data_dir, "backups")
-        os.makedirs(backup_dir, mode=0o755, exist_ok=True)
+        # Content-addressed backup snapshots; older folder-per-backup copies are converted once
+        self.backups = BackupStore(os.path.join(self.data_dir, "backups"))
+        self.backups.adopt_legacy_backups(DATA_FILES)
+
+        # CSV files by default, SQLite when FC_STORAGE_BACKEND=sqlite
+        self.storage = open_storage(self.data_dir)
 
         # Initialize Git sync
-        self.git_sync = GitSync(self.data_dir)
+        self.git_sync = GitSync(self.data_dir, staging_lock=lambda: self.storage.lock(*TABLE_COLUMNS))
         self.git_sync.init_repo()
-        self.git_sync.pull_changes()  # Pull latest changes on startup
 
-        self.ensure_csv_exists()
+        # Changes are committed in batches by a background worker
+        self.sync_worker = SyncWorker(self.git_sync, before_commit=self.storage.export_csv)
+
+        # Dashboard totals, adjusted by each write instead of re-summing the tables
+        self.ledger = TotalsLedger(self.data_dir, self.storage, self.expense_categories)
+
         self.lodestone = LodestoneScraper(fc_id)
+        self.refresh()
+
+        # Each FC syncs its roster on its own job thread, so a slow Lodestone
+        # fetch for one FC never holds up another
+        self.member_sync = BackgroundJob(
+            f"member-sync-{fc_id}",
+            lambda progress: self.sync_members_from_lodestone(progress=progress),
+            state_path=os.path.join(self.data_dir, "member_sync.json"),
+            lock_path=os.path.join(self.data_dir, "member_sync.lock"),
+            interval=MEMBER_SYNC_INTERVAL
+        )
+
+    @classmethod
+    def get_instance(cls, fc_id=DEFAULT_FC_ID):
+        """Get the shared per-process DataManager for an FC, creating it on first use
+
+        The manager is not held, so it may be closed once enough other FCs
+        are opened. Code that keeps using it, such as a script run, should
+        hold it with use() instead and ask for it again next time.
+        """
+        with cls.use(fc_id) as instance:
+            return instance
+
+    @classmethod
+    @contextmanager
+    def use(cls, fc_id=DEFAULT_FC_ID):
+        """Hold an FC's shared DataManager for the duration of a with block"""
+        instance = cls.acquire(fc_id)
+        try:
+            yield instance
+        finally:
+            cls.release(instance)
+
+    @classmethod
+    def acquire(cls, fc_id=DEFAULT_FC_ID):
+        """Get and hold the shared DataManager for an FC; pair with release()
+
+        At most MAX_OPEN_FCS managers stay open. Beyond that the least
+        recently used managers that nobody holds are closed, so a manager
+        is never closed under a session that is still using it. Building a
+        manager pulls its data, so only callers of the same FC wait for it.
+        An FC whose evicted manager is still closing is only reopened once
+        that close finishes, so two managers never share its repository.
+        """
+        with cls._instances_lock:
+            instance = cls._instances.get(fc_id)
+            if instance is not None:
+                cls._instances.move_to_end(fc_id)
+                instance._holders += 1
+                return instance
+            building = cls._building.setdefault(fc_id, threading.Lock())
+
+        with building:
+            with cls._instances_lock:
+                # Another thread may have built it while we waited for the lock
+                instance = cls._instances.get(fc_id)
+                if instance is not None:
+                    cls._instances.move_to_end(fc_id)
+                    instance._holders += 1
+                    return instance
+                closing = cls._closing.get(fc_id)
+            if closing is not None:
+                closing.wait()
+            instance = cls(fc_id=fc_id)
+            with cls._instances_lock:
+                instance._holders += 1
+                cls._instances[fc_id] = instance
+                cls._building.pop(fc_id, None)
+                evicted = cls._evict_idle()
+        cls._close_evicted(evicted)
+        return instance
+
+    @classmethod
+    def release(cls, instance):
+        """Stop holding a manager from acquire(), closing it if it is no longer needed"""
+        with cls._instances_lock:
+            instance._holders -= 1
+            evicted = cls._evict_idle()
+        cls._close_evicted(evicted)
+
+    @classmethod
+    def _evict_idle(cls):
+        """Take the least recently used unheld managers over MAX_OPEN_FCS out of the cache
+
+        Call with _instances_lock held.
+        """
+        evicted = []
+        for fc_id, instance in list(cls._instances.items()):
+            if len(cls._instances) <= max(MAX_OPEN_FCS, 1):
+                break
+            if instance._holders == 0:
+                evicted.append(cls._instances.pop(fc_id))
+                cls._closing[fc_id] = threading.Event()
+        return evicted
+
+    @classmethod
+    def _close_evicted(cls, evicted):
+        for idle in evicted:
+            # Closing flushes pending git commits, so don't make this caller wait
+            threading.Thread(target=cls._close_idle, args=(idle,), name=f"close-{idle.fc_id}", daemon=True).start()
+
+    @classmethod
+    def _close_idle(cls, idle):
+        """Close an evicted manager, then let acquire() reopen its FC"""
+        try:
+            idle.close()
+        except Exception as e:
+            logger.error("Error closing data manager for FC %s: %s", idle.fc_id, e)
+        finally:
+            with cls._instances_lock:
+                done = cls._closing.pop(idle.fc_id)
+            done.set()
+
+    @classmethod
+    def open_instances(cls):
+        """fc_ids of the open managers, least recently used first"""
+        with cls._instances_lock:
+            return list(cls._instances)
+
+    def close(self):
+        """Flush pending changes and release this FC's threads, caches and connections"""
+        logger.info("Closing data manager for FC %s", self.fc_id)
+        self.member_sync.stop()
+        self._background.shutdown(wait=True)
+        self.sync_worker.stop()
+        self.git_sync.shutdown()
+        self.lodestone.close()
+        with self._donation_index_lock:
+            self._donation_index = None
+        self.storage.close()
+
+    def refresh(self):
+        """Pull the latest data from Git and re-validate the CSV files"""
+        # Runs on the git executor so it never overlaps a commit; the executor
+        # takes the table locks itself, so writers wait while git replaces
+        # the files underneath them. Changes the sync worker hasn't committed
+        # yet are committed first, so the pull never meets uncommitted edits.
+        with self._refresh_lock:
+            self.git_sync.pull_changes_async(before_pull=self._export_pending,
+                                             after_pull=self._reload_after_pull).result()
+            return True
+
+    def _export_pending(self):
+        # Only queued changes need exporting (for SQLite); exporting otherwise
+        # would overwrite CSV mirrors that changed outside this process
+        if self.sync_worker.queue_depth:
+            self.storage.export_csv()
+
+    def _reload_after_pull(self):
+        self.storage.reload_from_csv()
+        # One-time schema upgrades; a no-op once the data directory is current
+        run_migrations(self.storage, self.data_dir)
+        if not all(self.storage.exists(table) for table in TABLE_COLUMNS):
+            self.ensure_csv_exists()
+
+    def refresh_async(self):
+        """Start a refresh in the background, reusing one that is already running
+
+        Returns right away, even while a synchronous refresh() is pulling;
+        the background refresh then runs after it.
+        """
+        with self._refresh_future_lock:
+            if self._refresh_future is None or self._refresh_future.done():
+                self._refresh_future = self._background.submit(self.refresh)
+            return self._refresh_future
+
+    def sync_members_async(self):
+        """Start a Lodestone member sync in the background, reusing one that is already running
+
+        Returns a Future resolving to the sync report, or None if the sync
+        failed or another process was already running one.
+        """
+        return self.member_sync.start('manual')
+
+    def get_member_sync_status(self):
+        """Get the running member sync with its progress, and the result of the last one"""
+        return self.member_sync.status()
 
     def ensure_csv_exists(self):
-        """Initialize CSV files if they don't exist"""
+        """Initialize data tables if they don't exist"""
         try:
-            # Initialize CSV files with default structure and sample data
-            default_files = {
-                self.members_path: {
-                    'columns': ['name', 'join_date'],
-                    'sample': []
-                },
-                self.donations_path: {
-                    'columns': ['member_name', 'amount', 'date', 'notes', 'timestamp'],
-                    'sample': []
-                },
-                self.expenses_path: {
-                    'columns': ['date', 'amount', 'description', 'category', 'approved_by', 'recipient', 'timestamp'],
-                    'sample': []
-                },
-                self.bids_path: {
-                    'columns': ['member_name', 'bid_number', 'date'],
-                    'sample': []
-                }
-            }
-
-            for file_path, config in default_files.items():
+            for table, columns in TABLE_COLUMNS.items():
                 try:
-                    if not os.path.exists(file_path):
-                        # Create new empty DataFrame with columns
-                        df = pd.DataFrame(columns=config['columns'])
-                        df.to_csv(file_path, index=False)
-                        print(f"Created new file: {file_path}")
-                    else:
-                        # Try to read existing file
-                        try:
-                            df = pd.read_csv(file_path)
-                            if len(df.columns) == 0:  # File exists but is empty
-                                df = pd.DataFrame(columns=config['columns'])
-                                df.to_csv(file_path, index=False)
-                                print(f"Reinitialized empty file: {file_path}")
-                        except pd.errors.EmptyDataError:
-                            # Handle empty file
-                            df = pd.DataFrame(columns=config['columns'])
-                            df.to_csv(file_path, index=False)
-                            print(f"Reinitialized empty file: {file_path}")
-
-                        # Add any missing columns
-                        missing_cols = set(config['columns']) - set(df.columns)
-                        if missing_cols:
-                            for col in missing_cols:
-                                df[col] = None
-                            # Ensure columns are in the correct order
-                            df = df.reindex(columns=config['columns'])
-                            df.to_csv(file_path, index=False)
-                            print(f"Added missing columns to {file_path}: {missing_cols}")
-
+                    self.storage.ensure_table(table, columns)
                 except Exception as file_error:
-                    print(f"Error processing file {file_path}: {str(file_error)}")
+                    logger.error("Error processing table %s: %s", table, file_error)
                     raise
 
             return True
         except Exception as e:
-            print(f"Error ensuring CSV files exist: {str(e)}")
+            logger.error("Error ensuring data tables exist: %s", e)
             raise
 
-    def backup_data(self):
-        """Create a backup of all data files"""
-        try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_folder = os.path.join(self.data_dir, f"backups/backup_{timestamp}")
-            os.makedirs(os.path.dirname(backup_folder), exist_ok=True)
+    def transaction(self, *tables):
+        """Stage changes to several tables and commit them atomically
 
-            # Copy all CSV files to backup folder
-            for file_name in ["donations.csv", "members.csv", "expenses.csv", "bids.csv"]:
-                src = os.path.join(self.data_dir, file_name)
-                dst = os.path.join(backup_folder, file_name)
-                if os.path.exists(src):
-                    shutil.copy2(src, dst)
+            with data_manager.transaction('members', 'bids') as txn:
+                txn.delete_where('members', member_id=member_id)
+                txn.delete_where('bids', member_id=member_id)
 
-            print(f"✅ Backup created successfully at {backup_folder}")
-            return True
-        except Exception as e:
-            print(f"❌ Error creating backup: {str(e)}")
-            return False
+        The tables are locked for the whole block and only the ones that
+        actually changed are written. Nothing is written if the block raises.
+        Callers queue a single git sync afterwards.
+        """
+        return self.storage.transaction(*tables)
 
-    def restore_latest_backup(self):
-        """Restore the most recent backup"""
+    def get_cache_stats(self):
+        """Get table cache hit/miss counters"""
+        return self.storage.stats()
+
+    def backup_data(self):
+        """Snapshot all data files and prune old snapshots
+
+        Returns the snapshot name, or False if the backup failed.
+        """
         try:
-            # Get list of backup folders
-            backup_folders = [d for d in os.listdir(os.path.join(self.data_dir,"backups")) 
-                            if os.path.isdir(os.path.join(os.path.join(self.data_dir,"backups"), d))]
+            self.storage.export_csv()
+            # Hold every table so the snapshot is consistent across files
+            with self.storage.lock(*TABLE_COLUMNS):
+                name = self.backups.create(self.data_dir, DATA_FILES,
+                                           schema_version=current_schema_version(self.storage, self.data_dir))
+            self.backups.prune()
+            logger.info("Backup snapshot %s created", name)
+            return name
+        except Exception as e:
+            logger.error("Error creating backup: %s", e)
+            return False
 
-            if not backup_folders:
-                print("No backups found")
-                return False
+    def list_backups(self):
+        """Get the manifests of all backup snapshots, oldest first"""
+        return self.backups.list_snapshots()
 
-            # Get most recent backup folder
-            latest_backup = max(backup_folders)
-            backup_folder = os.path.join(os.path.join(self.data_dir,"backups"), latest_backup)
+    def restore_latest_backup(self, name=None):
+        """Restore the most recent backup, or the named snapshot
 
-            # Restore all CSV files
-            for file_name in ["donations.csv", "members.csv", "expenses.csv", "bids.csv"]:
-                src = os.path.join(backup_folder, file_name)
-                dst = os.path.join(self.data_dir, file_name)
-                if os.path.exists(src):
-                    shutil.copy2(src, dst)
+        The snapshot's checksums are verified before any file is replaced.
+        Files from an older schema are migrated to the current one.
+        """
+        try:
+            name = name or self.backups.latest()
+            if name is None:
+                logger.warning("No backups found")
+                return False
 
-            print(f"✅ Data restored from backup {latest_backup}")
+            with self.storage.lock(*TABLE_COLUMNS):
+                self.backups.restore(name, self.data_dir)
+                self.storage.reload_from_csv()
+                schema_version = self.backups.snapshot(name).get('schema_version')
+                if schema_version is None:
+                    # Converted legacy backups predate the version file
+                    schema_version = stored_schema_version(self.storage)
+                write_schema_version(self.data_dir, schema_version)
+                run_migrations(self.storage, self.data_dir)
+
+            logger.info("Data restored from backup %s", name)
             return True
         except Exception as e:
-            print(f"❌ Error restoring backup: {str(e)}")
+            logger.error("Error restoring backup: %s", e)
             return False
 
-    def migrate_timestamps(self):
-        """Ensure all donations have unique timestamps"""
-        try:
-            df = pd.read_csv(self.donations_path)
-            if 'timestamp' not in df.columns or df['timestamp'].isna().any():
-                df['timestamp'] = df.apply(
-                    lambda x: f"{x['date']}_{x.name:03d}",
-                    axis=1
-                )
-                df.to_csv(self.donations_path, index=False)
-            return df
-        except Exception as e:
-            print(f"Error migrating timestamps: {str(e)}")
-            return pd.DataFrame(columns=['member_name', 'amount', 'date', 'notes', 'timestamp'])
-
     def get_donations(self):
-        """Get all donations with timestamp handling"""
+        """Get all donations, newest first"""
         try:
-            df = self.migrate_timestamps()
+            df = self.storage.read('donations')
             return df.sort_values('date', ascending=False)
         except Exception as e:
-            print(f"Error getting donations: {str(e)}")
-            return pd.DataFrame(columns=['member_name', 'amount', 'date', 'notes', 'timestamp'])
+            logger.error("Error getting donations: %s", e)
+            return pd.DataFrame(columns=TABLE_COLUMNS['donations'])
+
+    def get_donations_page(self, offset=0, limit=20):
+        """Get one page of donations, newest first, and the total donation count"""
+        return self.storage.query(
+            'donations', order_by=[('date', True), ('timestamp', True), ('id', True)], offset=offset, limit=limit
+        )
 
     def sync_to_git(self):
-        """Sync changes to Git repository"""
+        """Queue changes for the next batched Git commit"""
         try:
-            if self.git_sync.commit_and_push():
-                print("✅ Data synced to Git successfully")
-                return True
-            else:
-                print("❌ Failed to sync data to Git")
-                return False
+            self.sync_worker.request_sync()
+            return True
         except Exception as e:
-            print(f"❌ Error syncing to Git: {str(e)}")
+            logger.error("Error syncing to Git: %s", e)
             return False
 
-    def add_donation(self, member_name, amount, notes=""):
-        """Add a new donation record"""
-        try:
-            df = pd.read_csv(self.donations_path)
-            current_date = datetime.now().strftime('%Y-%m-%d')
+    def flush_sync(self, timeout=None):
+        """Commit any queued changes to Git right away"""
+        return self.sync_worker.flush(timeout)
 
-            # Create unique timestamp based on date and current number of donations
-            timestamp = f"{current_date}_{len(df):03d}"
+    def get_sync_status(self):
+        """Get the state of the background Git sync"""
+        status = self.sync_worker.status()
+        status['git'] = self.git_sync.operation_status()
+        return status
 
+    def add_donation(self, member_id, amount, notes=""):
+        """Add a new donation record"""
+        try:
+            now = datetime.now()
             new_donation = {
-                'member_name': member_name,
+                'id': new_record_id(),
+                'member_id': member_id,
                 'amount': amount,
-                'date': current_date,
+                'date': now.strftime('%Y-%m-%d'),
                 'notes': notes,
-                'timestamp': timestamp
+                'timestamp': now.strftime('%Y-%m-%d_%H%M%S')
             }
 
-            df = pd.concat([df, pd.DataFrame([new_donation])], ignore_index=True)
-            df.to_csv(self.donations_path, index=False)
+            with self.storage.lock('donations'), self._donation_index_lock, self.ledger.lock:
+                version_before = self.storage.version('donations')
+                totals_before = self.ledger.fingerprint()
+                self.storage.append('donations', new_donation)
+                self._update_donation_index(
+                    version_before, lambda index: self._index_add_donation(index, new_donation)
+                )
+                self.ledger.apply(totals_before, 'donations', donations=self._amount(amount))
 
             # Sync to Git after successful addition
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error adding donation: {str(e)}")
+            logger.error("Error adding donation: %s", e)
             return False
 
-    def delete_donation(self, timestamp):
+    def delete_donation(self, donation_id):
         """Delete a donation record"""
         try:
-            df = self.migrate_timestamps()
-            df = df[df['timestamp'] != timestamp]
-            df.to_csv(self.donations_path, index=False)
+            with self.storage.lock('donations'), self._donation_index_lock, self.ledger.lock:
+                version_before = self.storage.version('donations')
+                totals_before = self.ledger.fingerprint()
+                donation = self.storage.get_by_id('donations', donation_id)
+                self.storage.delete_by_id('donations', donation_id)
+                if donation is not None:
+                    self._update_donation_index(
+                        version_before, lambda index: self._index_refresh_member(index, donation['member_id'])
+                    )
+                if donation is not None:
+                    self.ledger.apply(totals_before, 'donations', donations=-self._amount(donation['amount']))
 
             # Sync to Git after successful deletion
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error deleting donation: {str(e)}")
+            logger.error("Error deleting donation: %s", e)
             return False
 
-    def update_donation_notes(self, timestamp, new_notes):
+    def update_donation_notes(self, donation_id, new_notes):
         """Update donation notes"""
         try:
-            df = self.migrate_timestamps()
-            df.loc[df['timestamp'] == timestamp, 'notes'] = new_notes
-            df.to_csv(self.donations_path, index=False)
+            with self.storage.lock('donations'), self._donation_index_lock:
+                with self.ledger.lock:
+                    totals_before = self.ledger.fingerprint()
+                    self.storage.update_by_id('donations', donation_id, {'notes': new_notes})
+                    self.ledger.apply(totals_before, 'donations')
+                self._donation_index = None
 
             # Sync to Git after successful update
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error updating donation notes: {str(e)}")
+            logger.error("Error updating donation notes: %s", e)
             return False
 
     def get_total_fc_gil(self):
         """Calculate total FC gil from donations"""
-        df = self.get_donations()
-        return df['amount'].sum() if not df.empty else 0
+        return self.ledger.totals()['total_donations']
 
     def get_total_expenses(self):
         """Calculate total expenses from all recorded expenses"""
         try:
-            df = pd.read_csv(self.expenses_path)
-            if df.empty:
-                return 0
-
-            # Only count expenses that haven't been returned
-            active_expenses = df[~df['description'].str.contains('Gil Returned', na=False)]
-            return active_expenses['amount'].sum() if not active_expenses.empty else 0
+            # Only expenses that haven't been returned are counted
+            return self.ledger.totals()['total_expenses']
         except Exception as e:
-            print(f"Error calculating total expenses: {e}")
+            logger.error("Error calculating total expenses: %s", e)
             return 0
 
+    def verify_totals(self):
+        """Check the running totals against a full recompute, repairing any drift"""
+        return self.ledger.verify()
+
+    @staticmethod
+    def _amount(value):
+        return 0 if pd.isna(value) else value
+
     def get_dashboard_stats(self):
         """Get overall financial statistics for the dashboard"""
         try:
-            donations = self.get_donations()
-            total_donations = donations['amount'].sum() if not donations.empty else 0
-
-            expenses = self.get_total_expenses()
+            totals = self.ledger.totals()
+            total_donations = totals['total_donations']
+            expenses = totals['total_expenses']
             fc_balance = total_donations - expenses
 
             return {
@@ -268,7 +514,7 @@ class DataManager:
                 'fc_balance': fc_balance
             }
         except Exception as e:
-            print(f"Error getting dashboard stats: {e}")
+            logger.error("Error getting dashboard stats: %s", e)
             return {
                 'total_donations': 0,
                 'total_expenses': 0,
@@ -276,274 +522,490 @@ class DataManager:
             }
 
     def get_all_members(self):
-        """Get all FC members"""
-        if not os.path.exists(self.members_path):
-            self.ensure_csv_exists()
-        return pd.read_csv(self.members_path)
+        """Get all current FC members"""
+        df = self.storage.read('members')
+        return df[df['left_date'].isna()]
+
+    @staticmethod
+    def member_label(name, world=None):
+        """Display name of a member, e.g. Martzia Droginovskya (Brynhildr)"""
+        return f"{name} ({world})" if isinstance(world, str) and world else name
+
+    def get_member_labels(self):
+        """Map every member id, former members included, to its display name"""
+        df = self.storage.read_columns('members', ['member_id', 'name', 'world'])
+        return {
+            member_id: self.member_label(name, world)
+            for member_id, name, world in zip(df['member_id'].tolist(), df['name'], df['world'])
+        }
 
-    def sync_members_from_lodestone(self):
-        """Sync members from Lodestone to local CSV"""
+    def _next_member_id(self):
+        member_ids = self.storage.read_columns('members', ['member_id'])['member_id']
+        return int(member_ids.max()) + 1 if member_ids.notna().any() else 1
+
+    def get_former_members(self):
+        """Get members who have left the FC"""
+        df = self.storage.read('members')
+        return df[df['left_date'].notna()]
+
+    def diff_members(self, scraped_members):
+        """Compare a scraped roster with the stored members
+
+        scraped_members are (name, world) pairs. Returns the added, rejoined,
+        removed and unchanged members as (name, world) keys. Rejoined members
+        are former members who appear on the roster again.
+        """
+        df = self.storage.read('members')
+        active = df['left_date'].isna()
+        keys = _member_keys(df)
+        stored_active = set(keys[active])
+        stored_former = set(keys[~active]) - stored_active
+        # A roster entry that shows no world matches a stored member of that name
+        worlds = {}
+        for name, world in keys:
+            worlds.setdefault(name, world)
+        scraped = list(dict.fromkeys((name, world or worlds.get(name)) for name, world in scraped_members))
+        scraped_set = set(scraped)
+
+        returning = [name for name in scraped if name not in stored_active]
+        return {
+            'added': [name for name in returning if name not in stored_former],
+            'rejoined': [name for name in returning if name in stored_former],
+            'removed': sorted(stored_active - scraped_set),
+            'unchanged': sorted(stored_active & scraped_set)
+        }
+
+    def sync_members_from_lodestone(self, progress=None):
+        """Apply the difference between the Lodestone roster and the stored members
+
+        New members are added with today's join date, members missing from
+        the roster are marked as departed, and everyone else is left alone.
+        Returns a sync report, or None if the roster could not be fetched.
+        Runs inline; the UI goes through sync_members_async instead.
+        """
         try:
-            print("🔄 Starting member sync...")
-            lodestone_members = self.lodestone.get_all_members()
-
-            if lodestone_members:
-                unique_members = list(dict.fromkeys(lodestone_members))
-                df = pd.DataFrame({
-                    'name': unique_members,
-                    'join_date': datetime.now().strftime('%Y-%m-%d')
-                })
-                df.to_csv(self.members_path, index=False)
-                return len(unique_members)
-            return 0
+            logger.info("Starting member sync for FC %s", self.fc_id)
+            lodestone_members = self.lodestone.get_all_members(progress=progress)
+            if not lodestone_members:
+                return None
+            if progress:
+                progress("Updating members")
+
+            today = datetime.now().strftime('%Y-%m-%d')
+            # Diff and apply under the lock so a concurrent sync can't add the same members twice
+            with self.storage.lock('members'):
+                diff = self.diff_members(lodestone_members)
+
+                if diff['removed'] or diff['rejoined']:
+                    removed, rejoined = set(diff['removed']), set(diff['rejoined'])
+
+                    def mark_departures(df):
+                        keys = _member_keys(df)
+                        df['left_date'] = df['left_date'].astype(object)
+                        df.loc[keys.map(removed.__contains__) & df['left_date'].isna(), 'left_date'] = today
+                        df.loc[keys.map(rejoined.__contains__), 'left_date'] = None
+                        return df
+                    self.storage.mutate('members', mark_departures)
+
+                next_id = self._next_member_id()
+                for member_id, (name, world) in enumerate(diff['added'], start=next_id):
+                    self.storage.append('members', {
+                        'id': new_record_id(), 'member_id': member_id, 'name': name, 'world': world,
+                        'join_date': today, 'left_date': None
+                    })
+
+            if diff['added'] or diff['removed'] or diff['rejoined']:
+                self.sync_to_git()
+
+            report = {
+                'added': [self.member_label(*key) for key in diff['added']],
+                'rejoined': [self.member_label(*key) for key in diff['rejoined']],
+                'removed': [self.member_label(*key) for key in diff['removed']],
+                'unchanged_count': len(diff['unchanged']),
+                'total': len(diff['unchanged']) + len(diff['added']) + len(diff['rejoined'])
+            }
+            logger.info("Member sync: %d added, %d rejoined, %d departed, %d unchanged",
+                        len(report['added']), len(report['rejoined']),
+                        len(report['removed']), report['unchanged_count'])
+            return report
         except Exception as e:
-            print(f"Error syncing members: {str(e)}")
-            return 0
+            logger.error("Error syncing members: %s", e)
+            return None
 
     # Housing Bids Methods
-    def add_bid(self, member_name, bid_number):
+    def add_bid(self, member_id, bid_number):
         """Add a new housing bid"""
-        df = pd.read_csv(self.bids_path)
         new_bid = {
-            'member_name': member_name,
+            'id': new_record_id(),
+            'member_id': member_id,
             'bid_number': bid_number,
             'date': datetime.now().strftime('%Y-%m-%d')
         }
-        df = pd.concat([df, pd.DataFrame([new_bid])], ignore_index=True)
-        df.to_csv(self.bids_path, index=False)
+        self.storage.append('bids', new_bid)
 
-    def delete_bid(self, member_name, bid_number, date):
+    def delete_bid(self, bid_id):
         """Delete a bid"""
-        df = pd.read_csv(self.bids_path)
-        mask = (df['member_name'] == member_name) & (df['bid_number'] == bid_number) & (df['date'] == date)
-        df = df[~mask]
-        df.to_csv(self.bids_path, index=False)
+        self.storage.delete_by_id('bids', bid_id)
 
-    def update_bid_number(self, member_name, old_bid_number, date, new_bid_number):
+    def update_bid_number(self, bid_id, new_bid_number):
         """Update a bid number"""
-        df = pd.read_csv(self.bids_path)
-        mask = (df['member_name'] == member_name) & (df['bid_number'] == old_bid_number) & (df['date'] == date)
-        df.loc[mask, 'bid_number'] = new_bid_number
-        df.to_csv(self.bids_path, index=False)
+        self.storage.update_by_id('bids', bid_id, {'bid_number': new_bid_number})
+
+    def get_all_bids(self):
+        """Get all housing bids"""
+        return self.storage.read('bids')
+
+    def get_bids_page(self, offset=0, limit=20):
+        """Get one page of housing bids, newest date first, and the total bid count"""
+        return self.storage.query(
+            'bids', order_by=[('date', True), ('bid_number', False)], offset=offset, limit=limit
+        )
 
-    def get_member_bids(self, member_name):
+    def get_member_bids(self, member_id):
         """Get all bids for a specific member"""
-        df = pd.read_csv(self.bids_path)
-        return df[df['member_name'] == member_name]
+        return self.storage.select('bids', member_id=member_id)
 
     # Expense Methods
-    def add_expense(self, amount, description, category, approved_by, recipient=None):
+    def add_expense(self, amount, description, category, approved_by_id, recipient_id=None):
         """Add a new expense"""
         try:
-            df = pd.read_csv(self.expenses_path)
             timestamp = datetime.now().strftime('%Y-%m-%d_%H%M%S')
             new_expense = {
+                'id': new_record_id(),
                 'date': datetime.now().strftime('%Y-%m-%d'),
                 'amount': amount,
                 'description': description,
                 'category': category,
-                'approved_by': approved_by,
-                'recipient': recipient if category == 'Housing' else None,
-                'timestamp': timestamp
+                'approved_by_id': approved_by_id,
+                'recipient_id': recipient_id if category == 'Housing' else None,
+                'timestamp': timestamp,
+                'status': EXPENSE_ACTIVE,
+                'returned_amount': 0,
+                'returned_date': None
             }
-            df = pd.concat([df, pd.DataFrame([new_expense])], ignore_index=True)
-            df.to_csv(self.expenses_path, index=False)
+            with self.storage.lock('expenses'), self.ledger.lock:
+                totals_before = self.ledger.fingerprint()
+                self.storage.append('expenses', new_expense)
+                self.ledger.apply(totals_before, 'expenses', expenses={category: self._amount(amount)})
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error adding expense: {str(e)}")
+            logger.error("Error adding expense: %s", e)
             return False
 
     def get_expenses_list(self):
         """Get all expenses"""
         try:
-            df = pd.read_csv(self.expenses_path)
+            df = self.storage.read('expenses')
             if not df.empty:
-                # If timestamp column doesn't exist, add it
-                if 'timestamp' not in df.columns:
-                    df['timestamp'] = df.apply(
-                        lambda x: f"{x['date']}_{x.name:06d}",
-                        axis=1
-                    )
-                    df.to_csv(self.expenses_path, index=False)
-
                 # Sort by timestamp in descending order (newest first)
                 df = df.sort_values('timestamp', ascending=False)
-                print(f"Debug: Found {len(df)} expenses")
-                print("Debug: First 5 expenses:")
-                print(df.head())
             return df
         except Exception as e:
-            print(f"Error getting expenses list: {str(e)}")
-            return pd.DataFrame(columns=['date', 'amount', 'description', 'category', 'approved_by', 'timestamp'])
+            logger.error("Error getting expenses list: %s", e)
+            return pd.DataFrame(columns=TABLE_COLUMNS['expenses'])
+
+    def get_expenses_page(self, offset=0, limit=20, category=None):
+        """Get one page of expenses, newest first, and the total number of matches
+
+        The category filter and the ordering are applied by the storage
+        backend, so only the requested rows are materialized.
+        """
+        filters = {'category': category} if category else None
+        return self.storage.query(
+            'expenses', filters=filters, order_by=[('timestamp', True), ('id', True)],
+            offset=offset, limit=limit
+        )
 
     def get_expenses_by_category(self):
-        """Get expenses grouped by category"""
-        df = pd.read_csv(self.expenses_path)
-        if df.empty:
-            return {category: 0 for category in self.expense_categories}
-
-        # Only count active expenses (not returned)
-        active_expenses = df[~df['description'].str.contains('Gil Returned', na=False)]
-        if active_expenses.empty:
-            return {category: 0 for category in self.expense_categories}
-
-        category_totals = active_expenses.groupby('category')['amount'].sum().to_dict()
-        for category in self.expense_categories:
-            if category not in category_totals:
-                category_totals[category] = 0
-        return category_totals
-
-    def delete_expense(self, date, amount, description, timestamp):
+        """Get active (not returned) expenses grouped by category"""
+        return self.ledger.totals()['expenses_by_category']
+
+    def _change_expense(self, expense_id, values=None):
+        """Update (or with values=None, delete) an expense and adjust the totals to match
+
+        values may be a callable taking the current expense, so a change can
+        be computed from the row it replaces. Returns the expense as it was
+        before the change, or None if no expense has that id.
+        """
+        with self.storage.lock('expenses'), self.ledger.lock:
+            totals_before = self.ledger.fingerprint()
+            expense = self.storage.get_by_id('expenses', expense_id)
+            if expense is None:
+                return None
+            if callable(values):
+                values = values(expense)
+            if values is None:
+                self.storage.delete_by_id('expenses', expense_id)
+                counted_after = 0
+            else:
+                self.storage.update_by_id('expenses', expense_id, values)
+                counted_after = net_expense_amount(dict(expense, **values))
+            counted_before = net_expense_amount(expense)
+            self.ledger.apply(
+                totals_before, 'expenses', expenses={expense['category']: counted_after - counted_before}
+            )
+            return expense
+
+    def delete_expense(self, expense_id):
         """Delete an expense"""
         try:
-            df = pd.read_csv(self.expenses_path)
-            mask = (df['timestamp'] == timestamp)
-            df = df[~mask]
-            df.to_csv(self.expenses_path, index=False)
+            self._change_expense(expense_id)
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error deleting expense: {str(e)}")
+            logger.error("Error deleting expense: %s", e)
             return False
 
-    def update_expense_notes(self, date, amount, description, new_description, timestamp):
+    def update_expense_notes(self, expense_id, new_description):
         """Update expense description"""
         try:
-            df = pd.read_csv(self.expenses_path)
-            mask = (df['timestamp'] == timestamp)
-            df.loc[mask, 'description'] = new_description
-            df.to_csv(self.expenses_path, index=False)
+            self._change_expense(expense_id, {'description': new_description})
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error updating expense notes: {str(e)}")
+            logger.error("Error updating expense notes: %s", e)
             return False
 
-    def return_expense_gil(self, expense_date, amount, description, approved_by, timestamp):
-        """Return gil from an expense back to the FC balance"""
+    def return_expense_gil(self, expense_id, amount=None):
+        """Return gil from an expense back to the FC balance
+
+        Returns everything still outstanding unless a partial amount is given.
+        """
+        def mark_returned(expense):
+            already = self._amount(expense.get('returned_amount'))
+            outstanding = expense['amount'] - already
+            returning = outstanding if amount is None else amount
+            if not 0 < returning <= outstanding:
+                raise ValueError(f"Can only return between 1 and {outstanding} gil")
+            returned = already + returning
+            return {
+                'status': EXPENSE_RETURNED if returned >= expense['amount'] else EXPENSE_PARTIALLY_RETURNED,
+                'returned_amount': returned,
+                'returned_date': datetime.now().strftime('%Y-%m-%d')
+            }
+
         try:
-            # Update the expense to mark it as returned
-            df = pd.read_csv(self.expenses_path)
-            mask = (df['timestamp'] == timestamp)
-            df.loc[mask, 'description'] = f"{description} (Gil Returned)"
-            df.to_csv(self.expenses_path, index=False)
+            if self._change_expense(expense_id, mark_returned) is None:
+                raise KeyError(f"No expense with id {expense_id}")
 
             # Sync changes
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error returning expense gil: {str(e)}")
+            logger.error("Error returning expense gil: %s", e)
             return False
 
-    def get_member_donations(self, member_name):
+    def get_member_donations(self, member_id):
         """Get all donations for a specific member"""
-        df = pd.read_csv(self.donations_path)
-        return df[df['member_name'] == member_name]
-
-    def get_member_donation_summary(self, member_name):
+        return self.storage.select('donations', member_id=member_id)
+
+    def get_member_donations_page(self, member_id, offset=0, limit=20):
+        """Get one page of a member's donations, newest first, and their donation count"""
+        return self.storage.query(
+            'donations', filters={'member_id': member_id},
+            order_by=[('date', True), ('timestamp', True), ('id', True)], offset=offset, limit=limit
+        )
+
+    @staticmethod
+    def _summarize_donations(df):
+        """Group donation rows by member in a single pass
+
+        Summaries hold totals, dates and the notes of the newest donation
+        (notes are shared by all of a member's donations), never the rows
+        themselves; pages of rows come from get_member_donations_page.
+        """
+        df = df.sort_values('date', kind='stable')
+        aggregates = df.groupby('member_id', sort=False).agg(
+            total_amount=('amount', 'sum'),
+            donation_count=('amount', 'size'),
+            first_donation=('date', 'min'),
+            last_donation=('date', 'max')
+        )
+        aggregates['notes'] = df.drop_duplicates('member_id', keep='last').set_index('member_id')['notes']
+        return aggregates.to_dict('index')
+
+    def _build_donation_index(self):
+        return self._summarize_donations(
+            self.storage.read_columns('donations', ['member_id', 'amount', 'date', 'notes'])
+        )
+
+    def _update_donation_index(self, version_before, apply):
+        """Apply an incremental change to the index, or drop it if it was already stale"""
+        if self._donation_index is not None and self._donation_index_version == version_before:
+            apply(self._donation_index)
+            self._donation_index_version = self.storage.version('donations')
+        else:
+            self._donation_index = None
+
+    def _index_add_donation(self, index, donation):
+        # Summaries hold schema-typed dates, like the ones built from the table
+        date = pd.Timestamp(donation['date'])
+        summary = index.get(donation['member_id'])
+        if summary is None:
+            index[donation['member_id']] = {
+                'total_amount': donation['amount'], 'donation_count': 1,
+                'first_donation': date, 'last_donation': date, 'notes': donation['notes']
+            }
+            return
+        summary = dict(summary, total_amount=summary['total_amount'] + donation['amount'],
+                       donation_count=summary['donation_count'] + 1,
+                       first_donation=min(summary['first_donation'], date))
+        if date >= summary['last_donation']:
+            summary.update(last_donation=date, notes=donation['notes'])
+        index[donation['member_id']] = summary
+
+    def _index_refresh_member(self, index, member_id):
+        """Re-summarize one member's donations, e.g. after one was deleted"""
+        summary = self._summarize_donations(self.get_member_donations(member_id)).get(member_id)
+        if summary is None:
+            index.pop(member_id, None)
+        else:
+            index[member_id] = summary
+
+    def _index_set_member_notes(self, index, member_id, notes):
+        summary = index.get(member_id)
+        if summary:
+            index[member_id] = dict(summary, notes=notes)
+
+    def get_donation_summaries(self):
+        """Get donation summaries for every member, keyed by member id
+
+        The index is built with one groupby pass and kept until the
+        donations table changes; DataManager's own writes update it in place.
+        Treat the returned dict as read-only.
+        """
+        with self._donation_index_lock:
+            version = self.storage.version('donations')
+            if self._donation_index is None or self._donation_index_version != version:
+                self._donation_index = self._build_donation_index()
+                self._donation_index_version = version
+            return self._donation_index
+
+    def get_donation_summaries_page(self, offset=0, limit=20):
+        """Get one page of (member id, summary) pairs, largest total first, and the member count"""
+        ranked = sorted(
+            self.get_donation_summaries().items(),
+            key=lambda item: item[1]['total_amount'],
+            reverse=True
+        )
+        end = None if limit is None else offset + limit
+        return ranked[offset:end], len(ranked)
+
+    def get_member_donation_summary(self, member_id):
         """Get summary of donations for a specific member"""
         try:
-            df = self.get_donations()
-            member_donations = df[df['member_name'] == member_name]
-
-            if member_donations.empty:
+            summary = self.get_donation_summaries().get(member_id)
+            if summary is None:
                 return {
                     'total_amount': 0,
                     'donation_count': 0,
                     'first_donation': None,
                     'last_donation': None,
-                    'donations': []
+                    'notes': None
                 }
-
-            # Sort donations by date
-            member_donations = member_donations.sort_values('date', ascending=False)
-
-            return {
-                'total_amount': member_donations['amount'].sum(),
-                'donation_count': len(member_donations),
-                'first_donation': member_donations['date'].iloc[-1],
-                'last_donation': member_donations['date'].iloc[0],
-                'donations': member_donations.to_dict('records')
-            }
+            return summary
         except Exception as e:
-            print(f"Error getting member donation summary: {str(e)}")
+            logger.error("Error getting member donation summary: %s", e)
             return None
-    
-    def update_member_donations_notes(self, member_name, new_notes):
+
+    def update_member_donations_notes(self, member_id, new_notes):
         """Update notes for all donations from a member"""
         try:
-            df = self.migrate_timestamps()
-            df.loc[df['member_name'] == member_name, 'notes'] = new_notes
-            df.to_csv(self.donations_path, index=False)
+            with self.storage.lock('donations'), self._donation_index_lock, self.ledger.lock:
+                version_before = self.storage.version('donations')
+                totals_before = self.ledger.fingerprint()
+                self.storage.update_where('donations', {'notes': new_notes}, member_id=member_id)
+                self._update_donation_index(
+                    version_before, lambda index: self._index_set_member_notes(index, member_id, new_notes)
+                )
+                self.ledger.apply(totals_before, 'donations')
             return True
         except Exception as e:
-            print(f"Error updating member donation notes: {str(e)}")
+            logger.error("Error updating member donation notes: %s", e)
             return False
 
-    def delete_member(self, member_name):
-        """Delete a member and their associated data"""
-        try:
-            # Remove from members list
-            members_df = pd.read_csv(self.members_path)
-            members_df = members_df[members_df['name'] != member_name]
-            members_df.to_csv(self.members_path, index=False)
-
-            # Remove their bids
-            bids_df = pd.read_csv(self.bids_path)
-            bids_df = bids_df[bids_df['member_name'] != member_name]
-            bids_df.to_csv(self.bids_path, index=False)
+    def delete_member(self, member_id):
+        """Delete a member and their associated data
 
-            #Remove their donations
-            donations_df = pd.read_csv(self.donations_path)
-            donations_df = donations_df[donations_df['member_name'] != member_name]
-            donations_df.to_csv(self.donations_path, index=False)
+        Their donations and bids are deleted. Expenses are kept, so a member
+        who approved or received one stays on as a former member to keep
+        those records attributed.
+        """
+        try:
+            tables = ('members', 'bids', 'donations')
+            with self.storage.lock(*tables), self._donation_index_lock, self.ledger.lock:
+                version_before = self.storage.version('donations')
+                totals_before = self.ledger.fingerprint()
+                removed = self.storage.select('donations', member_id=member_id)['amount'].sum()
+                referenced = (self.storage.count_where('expenses', approved_by_id=member_id)
+                              or self.storage.count_where('expenses', recipient_id=member_id))
+
+                # Members, bids and donations change together or not at all
+                with self.transaction(*tables) as txn:
+                    if not referenced:
+                        txn.delete_where('members', member_id=member_id)
+                    elif self.storage.select('members', member_id=member_id)['left_date'].isna().any():
+                        txn.update_where('members', {'left_date': datetime.now().strftime('%Y-%m-%d')},
+                                         member_id=member_id)
+                    txn.delete_where('bids', member_id=member_id)
+                    txn.delete_where('donations', member_id=member_id)
+
+                self._update_donation_index(version_before, lambda index: index.pop(member_id, None))
+                self.ledger.apply(totals_before, 'donations', donations=-self._amount(removed))
 
             # Sync changes to Git
             self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error deleting member: {str(e)}")
+            logger.error("Error deleting member: %s", e)
             return False
 
     def export_data_to_zip(self):
-        """Export all data files to a zip file"""
-        try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            zip_path = os.path.join(self.data_dir, f"fc_data_export_{timestamp}.zip")
+        """Build a compressed export of all data files in memory
 
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file_name in ["donations.csv", "members.csv", "expenses.csv", "bids.csv"]:
-                    file_path = os.path.join(self.data_dir, file_name)
-                    if os.path.exists(file_path):
-                        zipf.write(file_path, file_name)
+        The archive carries a manifest with each file's row count and
+        SHA-256. Returns (file_name, zip bytes), or None if the export failed.
+        """
+        try:
+            # One consistent view of every table
+            with self.storage.lock(*TABLE_COLUMNS):
+                self.storage.export_csv()
+                tables = {}
+                for table in TABLE_COLUMNS:
+                    with open(os.path.join(self.data_dir, f"{table}.csv"), 'rb') as f:
+                        tables[table] = (f.read(), self.storage.row_count(table))
+                schema_version = current_schema_version(self.storage, self.data_dir)
 
-            return zip_path
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            return f"fc_data_export_{timestamp}.zip", build_archive(tables, schema_version, fc_id=self.fc_id)
         except Exception as e:
-            print(f"Error exporting data: {str(e)}")
+            logger.error("Error exporting data: %s", e)
             return None
 
     def import_data_from_zip(self, zip_file):
-        """Import data from a zip file"""
-        try:
-            # Create a backup before import
-            self.backup_data()
+        """Import data from a zip file
 
-            with zipfile.ZipFile(zip_file, 'r') as zipf:
-                # Verify zip contains required files
-                file_list = zipf.namelist()
-                required_files = ["donations.csv", "members.csv", "expenses.csv", "bids.csv"]
-
-                if not all(file in file_list for file in required_files):
-                    raise ValueError("Zip file missing required data files")
+        The archive is checked against its manifest and the table schemas and
+        parsed in full before anything is replaced. All tables are then
+        swapped in together and migrated to the current schema.
+        """
+        restore_point = None
+        try:
+            frames, schema_version = read_archive(zip_file)
 
-                # Extract files to data directory
-                for file_name in required_files:
-                    zipf.extract(file_name, self.data_dir)
+            # Create a backup before import
+            restore_point = self.backup_data()
+            with self.storage.lock(*TABLE_COLUMNS):
+                self.storage.commit_tables(frames)
+                write_schema_version(self.data_dir, schema_version)
+                run_migrations(self.storage, self.data_dir)
 
+            self.sync_to_git()
             return True
         except Exception as e:
-            print(f"Error importing data: {str(e)}")
-            # Restore from backup if import fails
-            self.restore_latest_backup()
-            return False
\ No newline at end of file
+            logger.error("Error importing data: %s", e)
+            if restore_point:
+                # Undo a partly applied import; the snapshot records its schema version
+                self.restore_latest_backup(restore_point)
+            return False
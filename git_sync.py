@@ -1,80 +1,347 @@
 import os
 import subprocess
+import threading
+import time
+import atexit
+from collections import namedtuple
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-import streamlit as st
+from log_config import get_logger
+from migrations import SCHEMA_VERSION_FILE
+
+logger = get_logger(__name__)
+
+class GitResult(namedtuple('GitResult', ['args', 'returncode', 'stdout', 'stderr', 'duration'])):
+    """Outcome of a git command; truthy when the command succeeded"""
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def __bool__(self):
+        return self.ok
+
 
 class GitSync:
-    def __init__(self, data_dir, repo_url=None):
+    # Network operations get a longer timeout than local ones
+    DEFAULT_TIMEOUT = float(os.getenv('FC_GIT_TIMEOUT', 30))
+    NETWORK_TIMEOUT = float(os.getenv('FC_GIT_NETWORK_TIMEOUT', 120))
+
+    def __init__(self, data_dir, repo_url=None, staging_lock=None):
         self.data_dir = data_dir
         self.repo_url = repo_url
+        # Context manager factory held while files are staged, so a commit
+        # never picks up half of a multi-table write
+        self.staging_lock = staging_lock or nullcontext
         self.git_token = os.getenv('GITHUB_TOKEN')
+        # A single worker keeps git operations on this repository serialized
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="git")
+        self._status_lock = threading.Lock()
+        self.current_operation = None
+        self.last_results = {}
 
-    def run_git_command(self, command):
-        """Execute a git command and return the output"""
+    def run_git_command(self, args, timeout=None):
+        """Execute a git command given as an argv list and return a GitResult"""
+        args = ['git'] + list(args)
+        timeout = timeout or self.DEFAULT_TIMEOUT
+        started = time.monotonic()
         try:
             result = subprocess.run(
-                command,
+                args,
                 cwd=self.data_dir,
                 capture_output=True,
                 text=True,
-                shell=True
+                timeout=timeout
             )
-            if result.returncode != 0:
-                print(f"Git command failed: {result.stderr}")
-                return False
-            return True
+            outcome = GitResult(args, result.returncode, result.stdout, result.stderr,
+                                time.monotonic() - started)
+        except subprocess.TimeoutExpired as e:
+            stdout = e.stdout.decode(errors='replace') if isinstance(e.stdout, bytes) else (e.stdout or '')
+            outcome = GitResult(args, -1, stdout, f"Timed out after {timeout:.0f}s",
+                                time.monotonic() - started)
         except Exception as e:
-            print(f"Error executing git command: {str(e)}")
-            return False
+            outcome = GitResult(args, -1, '', str(e), time.monotonic() - started)
+
+        if outcome.ok:
+            logger.debug("%s finished in %.2fs", ' '.join(args[:2]), outcome.duration)
+        else:
+            logger.warning("Git command failed (%s): %s", ' '.join(args[:2]), outcome.stderr.strip())
+        return outcome
+
+    def _track(self, name, func):
+        """Run func while recording it as the current operation"""
+        with self._status_lock:
+            self.current_operation = {'name': name, 'started': datetime.now()}
+        try:
+            result = func()
+        finally:
+            with self._status_lock:
+                started = self.current_operation['started']
+                self.current_operation = None
+        with self._status_lock:
+            self.last_results[name] = {'ok': bool(result), 'started': started, 'finished': datetime.now()}
+        return result
+
+    def operation_status(self):
+        """Get the running git operation and the outcome of the last ones"""
+        with self._status_lock:
+            return {
+                'current': dict(self.current_operation) if self.current_operation else None,
+                'last': {name: dict(info) for name, info in self.last_results.items()}
+            }
 
     def init_repo(self):
         """Initialize git repository if it doesn't exist"""
         try:
             if not os.path.exists(os.path.join(self.data_dir, '.git')):
-                if not self.run_git_command('git init'):
+                if not self.run_git_command(['init']):
                     return False
 
                 # Configure git
-                self.run_git_command('git config user.name "FC Data Sync"')
-                self.run_git_command('git config user.email "fc-data-sync@noreply.github.com"')
+                self.run_git_command(['config', 'user.name', 'FC Data Sync'])
+                self.run_git_command(['config', 'user.email', 'fc-data-sync@noreply.github.com'])
 
                 if self.repo_url:
                     remote_url = self.repo_url.replace('https://', f'https://{self.git_token}@')
-                    self.run_git_command(f'git remote add origin {remote_url}')
+                    self.run_git_command(['remote', 'add', 'origin', remote_url])
 
-                print("Git repository initialized successfully")
+                logger.info("Git repository initialized")
             return True
         except Exception as e:
-            print(f"Error initializing Git repository: {str(e)}")
+            logger.error("Error initializing Git repository: %s", e)
             return False
 
     def commit_and_push(self):
         """Commit changes and push to remote"""
-        try:
-            # Stage all changes in data directory
-            self.run_git_command('git add *.csv')
+        return self._track('commit_and_push', self._commit_and_push)
+
+    def _commit(self):
+        """Stage and commit the data files; True if there was nothing to commit"""
+        # Stage the tables and their schema version, which clones need
+        # to tell migrated data from old data
+        paths = [':(glob)*.csv']
+        if os.path.exists(os.path.join(self.data_dir, SCHEMA_VERSION_FILE)):
+            paths.append(SCHEMA_VERSION_FILE)
+        with self.staging_lock():
+            self.run_git_command(['add', '--'] + paths)
+
+        # git commit fails when nothing is staged
+        staged = self.run_git_command(['diff', '--cached', '--name-only'])
+        if staged and not staged.stdout.strip():
+            return True
+
+        # Create commit with timestamp
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return self.run_git_command(['commit', '-m', f"Data sync: {timestamp}"])
 
-            # Create commit with timestamp
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.run_git_command(f'git commit -m "Data sync: {timestamp}"')
+    def _commit_and_push(self):
+        try:
+            commit = self._commit()
+            if not commit:
+                return commit
 
             # Push changes if remote is configured
             if self.repo_url:
-                self.run_git_command('git push origin main')
+                push = self.run_git_command(['push', 'origin', 'main'], timeout=self.NETWORK_TIMEOUT)
+                if not push:
+                    return push
 
-            print("Data synced successfully!")
+            logger.info("Data synced")
             return True
         except Exception as e:
-            print(f"Error in commit_and_push: {str(e)}")
+            logger.error("Error in commit_and_push: %s", e)
             return False
 
     def pull_changes(self):
         """Pull latest changes from remote"""
+        return self._track('pull_changes', self._pull_changes)
+
+    def _pull_changes(self):
         try:
             if self.repo_url:
-                self.run_git_command('git pull origin main')
-            print("Latest data pulled successfully")
+                pull = self.run_git_command(['pull', 'origin', 'main'], timeout=self.NETWORK_TIMEOUT)
+                if not pull:
+                    return pull
+            logger.info("Latest data pulled")
             return True
         except Exception as e:
-            print(f"Error pulling changes: {str(e)}")
-            return False
\ No newline at end of file
+            logger.error("Error pulling changes: %s", e)
+            return False
+
+    def _submit(self, func):
+        try:
+            return self._executor.submit(func)
+        except RuntimeError:
+            # The executor is shut down during interpreter exit; run inline
+            # so the final flush still gets committed
+            future = Future()
+            future.set_result(func())
+            return future
+
+    def shutdown(self):
+        """Wait for queued git operations and stop the executor"""
+        self._executor.shutdown(wait=True)
+
+    def pull_changes_async(self, before_pull=None, after_pull=None):
+        """Pull in the background; returns a Future resolving to the result
+
+        With after_pull, the pull and after_pull() run as one git task under
+        the staging lock, so nothing is written while pulled files are
+        reloaded. Before pulling, that task calls before_pull() and commits
+        any uncommitted changes locally (the next sync pushes them), so the
+        pull merges them instead of failing on a dirty tree. The staging
+        lock is only ever taken on the git executor, never while waiting for
+        it, so this can't deadlock with a commit.
+        """
+        if after_pull is None:
+            return self._submit(self.pull_changes)
+
+        def pull_and_apply():
+            with self.staging_lock():
+                if before_pull is not None:
+                    before_pull()
+                committed = self._track('commit', self._commit)
+                if committed:
+                    result = self.pull_changes()
+                else:
+                    logger.error("Not pulling: committing local changes failed: %s", committed.stderr.strip())
+                    result = committed
+                after_pull()
+                return result
+        return self._submit(pull_and_apply)
+
+    def commit_and_push_async(self):
+        """Commit and push in the background; returns a Future resolving to the result"""
+        return self._submit(self.commit_and_push)
+
+
+class SyncWorker:
+    """Background worker that batches data changes into a single Git commit
+
+    Mutations call request_sync() and return immediately. The worker waits
+    until `window` seconds have passed since the first pending change, or
+    until `max_batch` changes have queued up, and then commits them all at
+    once. Pending changes are flushed when the process exits.
+    """
+
+    def __init__(self, git_sync, window=None, max_batch=None, before_commit=None):
+        self.git_sync = git_sync
+        self.window = float(window if window is not None else os.getenv('FC_SYNC_WINDOW', 5))
+        self.max_batch = int(max_batch if max_batch is not None else os.getenv('FC_SYNC_BATCH', 20))
+        self.before_commit = before_commit
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._first_pending_at = None
+        self._in_flight = False
+        self._flush_requested = False
+        self._stopping = False
+        self._thread = None
+        self.last_sync = None
+        self.last_batch_size = 0
+        self.commits = 0
+        self.failures = 0
+        atexit.register(self.stop)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="git-sync-worker", daemon=True)
+            self._thread.start()
+
+    def request_sync(self):
+        """Queue a commit for the latest changes without blocking"""
+        with self._cond:
+            if self._pending == 0:
+                self._first_pending_at = time.monotonic()
+            self._pending += 1
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    @property
+    def queue_depth(self):
+        """Number of changes waiting to be committed"""
+        with self._cond:
+            return self._pending
+
+    def status(self):
+        """Get a snapshot of the worker's state"""
+        with self._cond:
+            return {
+                'queue_depth': self._pending,
+                'in_flight': self._in_flight,
+                'last_sync': self.last_sync,
+                'last_batch_size': self.last_batch_size,
+                'commits': self.commits,
+                'failures': self.failures
+            }
+
+    def _batch_ready(self):
+        if self._pending == 0:
+            return False
+        if self._flush_requested or self._stopping or self._pending >= self.max_batch:
+            return True
+        return time.monotonic() - self._first_pending_at >= self.window
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._batch_ready():
+                    if self._stopping and self._pending == 0:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = max(0.0, self.window - (time.monotonic() - self._first_pending_at))
+                    self._cond.wait(timeout)
+                batch = self._pending
+                self._pending = 0
+                self._first_pending_at = None
+                self._flush_requested = False
+                self._in_flight = True
+
+            ok = False
+            try:
+                if self.before_commit:
+                    self.before_commit()
+                ok = bool(self.git_sync.commit_and_push_async().result())
+            except Exception as e:
+                logger.error("Error syncing to Git: %s", e)
+
+            with self._cond:
+                self._in_flight = False
+                self.last_batch_size = batch
+                if ok:
+                    self.commits += 1
+                    self.last_sync = datetime.now()
+                    logger.info("Synced %d change(s) to Git", batch)
+                else:
+                    self.failures += 1
+                    logger.error("Failed to sync %d change(s) to Git", batch)
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Commit pending changes now and wait until they are written"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending == 0 and not self._in_flight:
+                return True
+            self._flush_requested = True
+            self._ensure_thread()
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self, timeout=30):
+        """Flush pending changes and stop the worker thread"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        # Nothing left to flush at exit; also lets a closed worker be freed
+        atexit.unregister(self.stop)
+        return flushed
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import pandas as pd
+from storage import _to_python
+from table_lock import atomic_write
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Running totals are persisted in this file inside the data directory
+LEDGER_FILE = "ledger_totals.json"
+
+# Tables the totals are derived from
+LEDGER_TABLES = ('donations', 'expenses')
+
+
+# Expense status values; the gil still spent is amount - returned_amount
+EXPENSE_ACTIVE = 'active'
+EXPENSE_RETURNED = 'returned'
+EXPENSE_PARTIALLY_RETURNED = 'partially_returned'
+
+
+def net_expense_amounts(expenses):
+    """Gil each expense still takes from the FC balance, as a Series"""
+    returned = pd.to_numeric(expenses['returned_amount'], errors='coerce').fillna(0)
+    net = expenses['amount'] - returned
+    # Fully returned expenses never count, whatever their amounts say
+    return net.where(expenses['status'] != EXPENSE_RETURNED, 0)
+
+
+def net_expense_amount(expense):
+    """Gil a single expense record still takes from the FC balance"""
+    if expense.get('status') == EXPENSE_RETURNED or pd.isna(expense.get('amount')):
+        return 0
+    returned = expense.get('returned_amount')
+    return expense['amount'] - (0 if pd.isna(returned) else returned)
+
+
+class TotalsLedger:
+    """Running donation and expense totals, kept in step with the tables
+
+    Mutators pass the fingerprint they saw before writing to apply(); if no
+    one else changed the tables in between, the totals are adjusted in O(1).
+    Otherwise (git pull, import, another process) they are recomputed from
+    the tables the next time they are read. Hold the written table's storage
+    lock and `lock` across the fingerprint, the write and apply() so
+    concurrent writers don't interleave.
+    """
+
+    def __init__(self, data_dir, storage, categories):
+        self.path = os.path.join(data_dir, LEDGER_FILE)
+        self.storage = storage
+        self.categories = list(categories)
+        self.lock = threading.RLock()
+        self._state = None
+        self.recomputes = 0
+
+    def fingerprint(self):
+        """Versions of the tables the totals were computed from"""
+        # Round-trip through JSON so it compares equal to a persisted one
+        return json.loads(json.dumps({table: self.storage.version(table) for table in LEDGER_TABLES}))
+
+    def _compute(self):
+        # Only the columns the totals need; cold reads skip parsing the rest
+        donations = self.storage.read_columns('donations', ['amount'])
+        expenses = self.storage.read_columns('expenses', ['amount', 'category', 'status', 'returned_amount'])
+        net = net_expense_amounts(expenses) if not expenses.empty else None
+        by_category = {category: 0 for category in self.categories}
+        if net is not None:
+            for category, amount in net.groupby(expenses['category'], observed=True).sum().items():
+                by_category[category] = _to_python(amount)
+        return {
+            'total_donations': _to_python(donations['amount'].sum()) if not donations.empty else 0,
+            'total_expenses': _to_python(net.sum()) if net is not None else 0,
+            'expenses_by_category': by_category,
+        }
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self):
+        atomic_write(self.path, lambda f: json.dump(self._state, f))
+
+    def recompute(self):
+        """Rebuild the totals from the tables and persist them"""
+        with self.lock:
+            fingerprint = self.fingerprint()
+            self._state = dict(self._compute(), fingerprint=fingerprint)
+            self.recomputes += 1
+            self._save()
+            return self._state
+
+    def totals(self):
+        """Return the current totals, recomputing them only if the tables changed"""
+        with self.lock:
+            fingerprint = self.fingerprint()
+            if self._state is None:
+                self._state = self._load()
+            if self._state is None or self._state.get('fingerprint') != fingerprint:
+                self.recompute()
+            state = dict(self._state)
+            state['expenses_by_category'] = dict(state['expenses_by_category'])
+            del state['fingerprint']
+            return state
+
+    def apply(self, fingerprint_before, table, donations=0, expenses=None):
+        """Adjust the totals after a write to table
+
+        donations is the change in total donations; expenses is a
+        {category: change} dict of net expense amounts.
+        """
+        with self.lock:
+            if self._state is None:
+                self._state = self._load()
+            fingerprint = self.fingerprint()
+            # Only the table being written may have moved; anything else
+            # means another writer got in and the delta is incomplete
+            others_changed = any(
+                fingerprint[other] != fingerprint_before[other] for other in LEDGER_TABLES if other != table
+            )
+            if self._state is None or self._state.get('fingerprint') != fingerprint_before or others_changed:
+                # The totals were already stale; rebuild them on the next read
+                self._state = None
+                return
+            self._state['total_donations'] = _to_python(self._state['total_donations'] + donations)
+            by_category = self._state['expenses_by_category']
+            for category, change in (expenses or {}).items():
+                if isinstance(category, str):
+                    by_category[category] = _to_python(by_category.get(category, 0) + change)
+                self._state['total_expenses'] = _to_python(self._state['total_expenses'] + change)
+            self._state['fingerprint'] = fingerprint
+            self._save()
+
+    def verify(self):
+        """Compare the running totals with a full recompute and repair them
+
+        Returns a dict of the fields that disagreed, as (running, recomputed)
+        pairs; an empty dict means the ledger was correct.
+        """
+        with self.lock:
+            running = self.totals()
+            expected = self._compute()
+            mismatches = {}
+            for key in ('total_donations', 'total_expenses'):
+                if running[key] != expected[key]:
+                    mismatches[key] = (running[key], expected[key])
+            for category in set(running['expenses_by_category']) | set(expected['expenses_by_category']):
+                have = running['expenses_by_category'].get(category, 0)
+                want = expected['expenses_by_category'].get(category, 0)
+                if have != want:
+                    mismatches[f"category:{category}"] = (have, want)
+            if mismatches:
+                logger.warning("Ledger totals disagreed with the tables: %s", mismatches)
+                self.recompute()
+            return mismatches
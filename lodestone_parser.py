@@ -0,0 +1,232 @@
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from bs4 import BeautifulSoup, SoupStrainer
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:  # older selectolax releases only ship the modest backend
+        from selectolax.parser import HTMLParser
+    except ImportError:  # selectolax is optional
+        HTMLParser = None
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup tree builder)
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# Candidate selectors, in the order they are tried
+LIST_SELECTORS = ["div.entry__block", "div.entry__freecompany__fc-member", "li.entry"]
+NAME_SELECTORS = ["p.entry__name", "div.entry__freecompany__fc-member__name", "p.entry__freecompany__member__name"]
+WORLD_SELECTORS = ["p.entry__world", "div.entry__freecompany__fc-member__world"]
+
+# The selectors that work for one layout; chosen on the first page of a sync
+Selectors = namedtuple('Selectors', ['list', 'name', 'world'])
+
+# One parsed roster page: (name, world) pairs, the page count if shown,
+# whether there is a next page, and the selectors that matched
+RosterPage = namedtuple('RosterPage', ['members', 'total_pages', 'has_next', 'selectors'])
+
+# Worlds are shown as "Brynhildr [Crystal]"; the data center suffix is dropped
+_DATA_CENTER = re.compile(r"\s*\[[^\]]*\]\s*$")
+
+# Only elements carrying one of these classes (and their children) are
+# built by the BeautifulSoup backends; the rest of the page is skipped
+_SUBTREE_CLASSES = {"entry", "entry__block", "entry__freecompany__fc-member", "btn__pager"}
+
+
+def _in_subtree(classes):
+    if not classes:
+        return False
+    if isinstance(classes, str):
+        classes = classes.split()
+    return any(cls in _SUBTREE_CLASSES for cls in classes)
+
+
+class _SoupBackend:
+    """BeautifulSoup with a given tree builder, parsing only the roster subtree"""
+
+    def __init__(self, features):
+        self.name = features
+        self.features = features
+
+    def parse(self, html):
+        return BeautifulSoup(html, self.features, parse_only=SoupStrainer(class_=_in_subtree))
+
+    def select(self, node, selector):
+        return node.select(selector)
+
+    def select_one(self, node, selector):
+        return node.select_one(selector)
+
+    def text(self, node):
+        return node.get_text(" ", strip=True)
+
+    def attr(self, node, name):
+        return node.get(name)
+
+
+class _SelectolaxBackend:
+    """selectolax CSS selection on the whole document"""
+
+    name = 'selectolax'
+
+    def parse(self, html):
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', errors='replace')
+        return HTMLParser(html)
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def select_one(self, node, selector):
+        return node.css_first(selector)
+
+    def text(self, node):
+        return node.text(separator=" ", strip=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+
+def available_backends():
+    """Names of the parser backends usable in this environment, fastest first"""
+    backends = []
+    if HTMLParser is not None:
+        backends.append('selectolax')
+    if HAS_LXML:
+        backends.append('lxml')
+    backends.append('html.parser')
+    return backends
+
+
+def _make_backend(name):
+    if name == 'selectolax':
+        if HTMLParser is None:
+            raise ValueError("selectolax is not installed")
+        return _SelectolaxBackend()
+    if name == 'lxml' and not HAS_LXML:
+        raise ValueError("lxml is not installed")
+    if name not in ('lxml', 'html.parser'):
+        raise ValueError(f"Unknown HTML parser backend: {name}")
+    return _SoupBackend(name)
+
+
+class RosterParser:
+    """Parses Lodestone FC member pages
+
+    The first page of a sync decides which list and name selectors work;
+    passing them on to the parses of later pages skips trying every
+    candidate. The parser keeps no state between pages, so one parser can
+    be shared by concurrent fetches.
+    """
+
+    def __init__(self, backend=None):
+        backend = backend or os.environ.get('FC_HTML_PARSER') or available_backends()[0]
+        self.backend = _make_backend(backend)
+
+    def _pick_list_selector(self, doc):
+        for selector in LIST_SELECTORS:
+            entries = self.backend.select(doc, selector)
+            if entries:
+                return selector, entries
+        return None, []
+
+    def _pick_selector(self, entries, selectors):
+        for entry in entries:
+            for selector in selectors:
+                if self.backend.select_one(entry, selector) is not None:
+                    return selector
+        return None
+
+    def _world(self, entry, world_selector):
+        if world_selector is None:
+            return None
+        world_element = self.backend.select_one(entry, world_selector)
+        if world_element is None:
+            return None
+        return _DATA_CENTER.sub('', self.backend.text(world_element)) or None
+
+    def parse(self, html, selectors=None):
+        """Parse a roster page into a RosterPage
+
+        selectors are the Selectors of an earlier page of the same roster;
+        when they don't match this page, the candidates are tried again.
+        Members are (name, world) pairs; world is None when the page doesn't
+        show one.
+        """
+        doc = self.backend.parse(html)
+
+        entries = self.backend.select(doc, selectors.list) if selectors and selectors.list else []
+        if not entries:
+            list_selector, entries = self._pick_list_selector(doc)
+            selectors = Selectors(list_selector, None, None)
+        if not entries:
+            preview = html[:500].decode('utf-8', errors='replace') if isinstance(html, bytes) else html[:500]
+            logger.error("Could not find member elements with any selector")
+            logger.debug("HTML preview: %s", preview)
+            return RosterPage([], None, False, None)
+
+        if selectors.name is None:
+            selectors = selectors._replace(name=self._pick_selector(entries, NAME_SELECTORS),
+                                           world=self._pick_selector(entries, WORLD_SELECTORS))
+
+        members = []
+        if selectors.name:
+            for entry in entries:
+                name_element = self.backend.select_one(entry, selectors.name)
+                if name_element is not None:
+                    name = self.backend.text(name_element)
+                    if name:
+                        members.append((name, self._world(entry, selectors.world)))
+
+        has_next = self.backend.select_one(doc, "a.btn__pager__next") is not None
+        return RosterPage(members, self._total_pages(doc), has_next, selectors)
+
+    def _total_pages(self, doc):
+        """Read the page count from the pager ("Page 1 of 4"), if present"""
+        current = self.backend.select_one(doc, ".btn__pager__current")
+        if current is not None:
+            match = re.search(r"of\s*(\d+)", self.backend.text(current))
+            if match:
+                return int(match.group(1))
+        last_link = self.backend.select_one(doc, "a.btn__pager__next--all")
+        if last_link is not None and self.backend.attr(last_link, 'href'):
+            match = re.search(r"page=(\d+)", self.backend.attr(last_link, 'href'))
+            if match:
+                return int(match.group(1))
+        return None
+
+
+def benchmark(pages, backends=None, repeat=5):
+    """Parse saved roster pages with each backend and return pages/sec"""
+    results = {}
+    for name in backends or available_backends():
+        parser = RosterParser(name)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            selectors = None
+            for html in pages:
+                selectors = parser.parse(html, selectors).selectors
+        elapsed = time.perf_counter() - started
+        results[name] = len(pages) * repeat / elapsed if elapsed else float('inf')
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python lodestone_parser.py saved_page1.html [saved_page2.html ...]
+    if len(sys.argv) < 2:
+        sys.exit("usage: python lodestone_parser.py PAGE.html [PAGE.html ...]")
+    saved_pages = []
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            saved_pages.append(f.read())
+    for backend_name, rate in benchmark(saved_pages).items():
+        print(f"{backend_name:>12}: {rate:8.1f} pages/sec")
@@ -1,89 +1,164 @@
-import requests
-from bs4 import BeautifulSoup
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from lodestone_parser import RosterParser
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+LODESTONE_URL = "https://na.finalfantasyxiv.com/lodestone/freecompany/{fc_id}/member/"
+
 
 class LodestoneScraper:
-    def __init__(self, fc_id="9228157111459014466"):
+    def __init__(self, fc_id="9228157111459014466", base_url=None, max_workers=4,
+                 max_retries=3, backoff=1.0, timeout=15, max_pages=50, parser_backend=None):
         self.fc_id = fc_id
-        self.base_url = f"https://na.finalfantasyxiv.com/lodestone/freecompany/{fc_id}/member/"
+        # base_url can point at a local server that serves saved roster pages
+        self.base_url = base_url or LODESTONE_URL.format(fc_id=fc_id)
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
         }
-
-    def get_all_members(self):
-        """Scrapes all FC members from Lodestone, handling pagination dynamically."""
-        members = []
-        page = 1
-        max_retries = 3
-
-        while True:
-            url = f"{self.base_url}?page={page}"
-            print(f"📃 Fetching page {page}: {url}")
-
-            for attempt in range(max_retries):
-                try:
-                    if attempt > 0:
-                        time.sleep(2)  # Delay between retries
-
-                    response = requests.get(url, headers=self.headers)
-                    response.raise_for_status()
-
-                    soup = BeautifulSoup(response.content, 'html.parser')
-
-                    # Updated selector for member entries
-                    member_list = soup.select("div.entry__block")
-
-                    if not member_list:
-                        # Try alternative selector
-                        member_list = soup.select("div.entry__freecompany__fc-member")
-
-                    if not member_list:
-                        print(f"❌ No members found on page {page}, trying different selector")
-                        member_list = soup.select("li.entry")
-
-                    if not member_list:
-                        print("❌ Could not find member elements with any selector")
-                        print("HTML preview:", soup.prettify()[:500])
-                        return list(dict.fromkeys(members))  # Return unique members
-
-                    # Process members on this page
-                    for member_entry in member_list:
-                        # Try different possible name element selectors
-                        name_element = (
-                            member_entry.select_one("p.entry__name") or
-                            member_entry.select_one("div.entry__freecompany__fc-member__name") or
-                            member_entry.select_one("p.entry__freecompany__member__name")
-                        )
-
-                        if name_element:
-                            member_name = name_element.get_text(strip=True)
-                            if member_name:
-                                full_name = f"{member_name}\nBrynhildr"
-                                if full_name not in members:  # Only add if not already in list
-                                    members.append(full_name)
-
-                    print(f"✅ Found {len(member_list)} members on page {page}")
-
-                    # Check for next page button
-                    next_button = soup.select_one("a.btn__pager__next")
-                    if not next_button:
-                        print("🏁 Reached last page")
-                        return list(dict.fromkeys(members))  # Return unique members
-
-                    # Success - move to next page
-                    page += 1
-                    break
-
-                except requests.RequestException as e:
-                    print(f"❌ Error fetching page {page} (attempt {attempt + 1}): {str(e)}")
-                    if attempt == max_retries - 1:  # Last attempt failed
-                        return list(dict.fromkeys(members))  # Return unique members
-                    time.sleep(2)  # Wait before retry
-
-            # Safety check - don't go beyond reasonable number of pages
-            if page > 10:  # Assuming FC won't have more than 10 pages of members
-                print("🛑 Reached maximum page limit")
-                break
-
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_pages = max_pages
+
+        # lxml/selectolax when installed, html.parser otherwise
+        self.parser = RosterParser(parser_backend)
+
+        # One pooled session shared by all page fetches
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Per-URL ETag/Last-Modified validators and the members parsed from that page
+        self._page_cache = {}
+        self._cache_lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'retries': 0}
+
+    def close(self):
+        """Close the pooled HTTP connections"""
+        self.session.close()
+
+    def page_url(self, page):
+        return f"{self.base_url}?page={page}"
+
+    def _count(self, key):
+        with self._cache_lock:
+            self.stats[key] += 1
+
+    def _sleep_before_retry(self, attempt):
+        """Exponential backoff with full jitter"""
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def _fetch_page(self, page, selectors=None):
+        """Fetch and parse one roster page, reusing the cached result on 304
+
+        selectors are the ones page 1 matched. Returns a RosterPage, or None
+        if every attempt failed. A page that parses to no members counts as
+        a failed attempt.
+        """
+        url = self.page_url(page)
+        with self._cache_lock:
+            cached = self._page_cache.get(url)
+
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        for attempt in range(self.max_retries):
+            if attempt > 0:
+                self._count('retries')
+                self._sleep_before_retry(attempt - 1)
+            try:
+                logger.debug("Fetching page %d: %s", page, url)
+                self._count('requests')
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+                if response.status_code == 304 and cached:
+                    self._count('not_modified')
+                    return cached['result']
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(f"{response.status_code} from {url}", response=response)
+                response.raise_for_status()
+
+                result = self._parse_page(response.content, page, selectors)
+                if not result.members:
+                    # Only pages inside the roster are fetched, so an empty one is a
+                    # maintenance or changed-layout page; accepting it would make
+                    # everyone listed on it look like they left the FC
+                    logger.warning("Page %d has no members (attempt %d)", page, attempt + 1)
+                    continue
+                with self._cache_lock:
+                    self._page_cache[url] = {
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'result': result
+                    }
+                return result
+
+            except requests.RequestException as e:
+                logger.warning("Error fetching page %d (attempt %d): %s", page, attempt + 1, e)
+        return None
+
+    def _parse_page(self, html, page, selectors=None):
+        """Parse a roster page into a RosterPage of (name, world) members"""
+        result = self.parser.parse(html, selectors)
+        logger.debug("Found %d members on page %d", len(result.members), page)
+        return result
+
+    def get_all_members(self, progress=None):
+        """Scrapes all FC members from Lodestone as (name, world) pairs, fetching pages concurrently.
+
+        progress, if given, is called as progress(step, pages_done, total_pages) after each page.
+        """
+        progress = progress or (lambda step, done=None, total=None: None)
+        progress("Fetching roster", 0, None)
+        first = self._fetch_page(1)
+        if first is None:
+            return []
+        # Every other page is parsed with the selectors page 1 matched; the
+        # tuple is immutable, so the fetch threads can share it
+        selectors = first.selectors
+        total_pages, has_next = first.total_pages, first.has_next
+        pages = [first.members]
+
+        if total_pages:
+            # Page count known up front: fetch the rest with bounded parallelism
+            page_count = min(total_pages, self.max_pages)
+            progress("Fetching roster", 1, page_count)
+            remaining = range(2, page_count + 1)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for result in executor.map(lambda page: self._fetch_page(page, selectors), remaining):
+                    if result is None:
+                        # A page failed after all retries; returning a partial
+                        # roster would look like members left the FC
+                        logger.error("Failed to fetch every roster page")
+                        return []
+                    pages.append(result.members)
+                    progress("Fetching roster", len(pages), page_count)
+        else:
+            # No pager information; follow the next button one page at a time
+            page = 1
+            while has_next and page < self.max_pages:
+                page += 1
+                result = self._fetch_page(page, selectors)
+                if result is None:
+                    logger.error("Failed to fetch every roster page")
+                    return []
+                pages.append(result.members)
+                has_next = result.has_next
+                progress("Fetching roster", len(pages), None)
+
+        logger.info("Fetched %d roster page(s)", len(pages))
         # Return unique members, preserving order
-        return list(dict.fromkeys(members))
\ No newline at end of file
+        return list(dict.fromkeys(member for page_members in pages for member in page_members))
@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Environment variables read by configure_logging():
+#   FC_LOG_LEVEL   default level for every module (INFO)
+#   FC_LOG_LEVELS  per-module overrides, e.g. "git_sync=DEBUG,lodestone_scraper=WARNING"
+#   FC_LOG_FORMAT  "text" (default) or "json" (one object per line)
+DEFAULT_LEVEL = "INFO"
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(spec):
+    """Parse "module=LEVEL,module=LEVEL" into a dict, ignoring malformed entries"""
+    levels = {}
+    for item in (spec or "").split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, levels=None, fmt=None, stream=None, force=False):
+    """Install a single stderr handler on the root logger
+
+    Arguments default to the FC_LOG_* environment variables. Later calls
+    are no-ops unless force=True, so every module can call this safely.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured and not force:
+            return
+        level = (level or os.environ.get('FC_LOG_LEVEL') or DEFAULT_LEVEL).upper()
+        levels = levels if levels is not None else parse_levels(os.environ.get('FC_LOG_LEVELS'))
+        fmt = (fmt or os.environ.get('FC_LOG_FORMAT') or 'text').lower()
+
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            if getattr(existing, '_fc_handler', False):
+                root.removeHandler(existing)
+        handler._fc_handler = True
+        root.addHandler(handler)
+        root.setLevel(level)
+        for name, module_level in levels.items():
+            logging.getLogger(name).setLevel(module_level)
+        _configured = True
+
+
+def get_logger(name):
+    """Return the logger for a module, configuring logging on first use"""
+    configure_logging()
+    return logging.getLogger(name)
@@ -1,28 +1,141 @@
+import html
 import streamlit as st
 import pandas as pd
-import os
-from data_handler import DataManager
+from data_handler import DataManager, hosted_fcs
+from ledger import EXPENSE_RETURNED, EXPENSE_PARTIALLY_RETURNED
+from table_schema import format_date
 from styles import apply_custom_styles
 from datetime import datetime
 
+# Free Companies hosted by this deployment; each session picks one
+fcs = hosted_fcs()
+if st.session_state.get('fc_id') not in fcs:
+    st.session_state.fc_id = next(iter(fcs))
+
 # Page configuration must be the first Streamlit command
 st.set_page_config(
-    page_title="Lotus Free Company",
+    page_title=f"{fcs[st.session_state.fc_id]} Free Company",
     page_icon="💰",
     layout="wide"
 )
 
-# Initialize session state for FC ID
-if 'fc_id' not in st.session_state:
-    st.session_state.fc_id = "9228157111459014466"  # Default FC ID
+PAGE_SIZES = [10, 20, 50, 100]
+
+
+def page_window(key):
+    """Return the (offset, limit) currently selected for a paginated list"""
+    page_size = st.session_state.get(f"{key}_page_size", PAGE_SIZES[1])
+    page_number = st.session_state.get(f"{key}_page", 1)
+    return (page_number - 1) * page_size, page_size
+
+
+def pager(key, total):
+    """Render page-size and page-number controls for a list of `total` rows"""
+    offset, page_size = page_window(key)
+    page_count = max(1, -(-total // page_size))
+    if offset and offset >= total:
+        # The list shrank (delete or new filter); jump to the last page
+        st.session_state[f"{key}_page"] = page_count
+        st.rerun()
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.selectbox("Per page", PAGE_SIZES, index=PAGE_SIZES.index(page_size), key=f"{key}_page_size")
+    with col2:
+        st.number_input("Page", min_value=1, max_value=page_count, key=f"{key}_page")
+    with col3:
+        st.caption(f"Page {st.session_state.get(f'{key}_page', 1)} of {page_count} ({total} total)")
+
+
+def returned_label(expense):
+    """Header suffix showing how much of an expense was returned"""
+    if expense.get('status') == EXPENSE_RETURNED:
+        return " (Returned)"
+    if expense.get('status') == EXPENSE_PARTIALLY_RETURNED:
+        return f" ({expense['returned_amount']:,.0f} gil returned)"
+    return ""
+
+
+def return_gil_controls(data_manager, expense, key):
+    """Render the amount input and button for returning an expense's gil"""
+    returned = expense.get('returned_amount')
+    outstanding = int(expense['amount'] - (0 if pd.isna(returned) else returned))
+    amount = st.number_input("Gil to return", min_value=1, max_value=outstanding,
+                             value=outstanding, step=1000, key=f"return_amount_{key}")
+    if st.button("💰 Return Gil", key=f"return_{key}", type="primary"):
+        if data_manager.return_expense_gil(expense['id'], amount):
+            st.success(f"{amount:,.0f} gil returned to FC balance!")
+            st.rerun()
+        else:
+            st.error("Failed to return gil")
+
+
+def member_select(data_manager, label, key=None):
+    """Selectbox over the current members that returns the chosen member id"""
+    labels = data_manager.get_member_labels()
+    options = data_manager.get_all_members()['member_id'].tolist()
+    return st.selectbox(label, options, format_func=labels.get, key=key)
+
+
+def member_name(labels, member_id):
+    """Display name of the member a record refers to"""
+    if pd.isna(member_id):
+        return ""
+    return labels.get(member_id, f"Member #{member_id}")
+
+
+def member_sync_status(fc_id):
+    """Progress of a running Lodestone member sync, or the outcome of the last one"""
+    # Fragment reruns skip the rest of the script, so hold the manager here too
+    with DataManager.use(fc_id) as data_manager:
+        status = data_manager.get_member_sync_status()
+    if status['running']:
+        st.session_state.member_sync_running = True
+        progress = status['progress']
+        if progress and progress['total']:
+            st.progress(progress['done'] / progress['total'],
+                        text=f"{progress['step']}: page {progress['done']} of {progress['total']}")
+        else:
+            st.info(f"⏳ {progress['step'] if progress else 'Syncing members from Lodestone'}...")
+        return
+    if st.session_state.pop('member_sync_running', False):
+        st.rerun()
+
+    last = status['last']
+    if last:
+        finished = datetime.fromisoformat(last['finished'])
+        caption = f"Last sync {finished:%Y-%m-%d %H:%M} ({last['trigger']})"
+        report = last['result']
+        if last['ok']:
+            st.success(
+                f"Synced {report['total']} members from Lodestone: "
+                f"{len(report['added'])} joined, {len(report['rejoined'])} rejoined, "
+                f"{len(report['removed'])} left"
+            )
+        else:
+            st.error("Failed to sync members from Lodestone")
+        if status['next_run']:
+            caption += f", next {status['next_run']:%Y-%m-%d %H:%M}"
+        st.caption(caption)
+
+
+if len(fcs) > 1:
+    st.sidebar.selectbox("Free Company", list(fcs), format_func=fcs.get, key='fc_id')
 
+data_manager = None
 try:
-    # Initialize data manager
-    data_manager = DataManager(fc_id=st.session_state.fc_id)
+    # Shared data manager, built once per process for each FC. It is held
+    # for this run only and fetched again on the next one, so an FC nobody
+    # is using can be closed.
+    data_manager = DataManager.acquire(fc_id=st.session_state.fc_id)
     apply_custom_styles()
 
     # Main header
-    st.markdown("<h1 class='main-header'>Lotus Free Company</h1>", unsafe_allow_html=True)
+    st.markdown(f"<h1 class='main-header'>{html.escape(fcs[st.session_state.fc_id])} Free Company</h1>",
+                unsafe_allow_html=True)
+
+    # Display names of every member, for records that refer to them by id
+    member_labels = data_manager.get_member_labels()
 
     # Navigation
     page = st.sidebar.selectbox(
@@ -30,6 +143,20 @@ try:
         ["Dashboard", "Donations", "Housing Bids", "Expenses", "Members List"]
     )
 
+    if st.sidebar.button("🔄 Refresh Data", key="refresh_data"):
+        data_manager.refresh_async()
+        st.rerun()
+
+    sync_status = data_manager.get_sync_status()
+    current_git_op = sync_status['git']['current']
+    if current_git_op:
+        elapsed = (datetime.now() - current_git_op['started']).total_seconds()
+        st.sidebar.caption(f"⏳ Git: {current_git_op['name'].replace('_', ' ')} running for {elapsed:.0f}s")
+    st.sidebar.caption(
+        f"Git sync: {sync_status['queue_depth']} pending change(s)"
+        + (f", last synced {sync_status['last_sync']:%H:%M:%S}" if sync_status['last_sync'] else "")
+    )
+
     # Dashboard
     if page == "Dashboard":
         stats = data_manager.get_dashboard_stats()
@@ -47,17 +174,15 @@ try:
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Recent Donations")
-            donations = data_manager.get_donations()
+            donations, _ = data_manager.get_donations_page(limit=5)
             if not donations.empty:
-                # Sort by date and timestamp in descending order
-                donations = donations.sort_values(['date', 'timestamp'], ascending=[False, False])
-                for _, donation in donations.head(5).iterrows():
-                    member_summary = data_manager.get_member_donation_summary(donation['member_name'])
-                    with st.expander(f"{donation['member_name']} - {donation['amount']:,.0f} gil"):
+                for _, donation in donations.iterrows():
+                    member_summary = data_manager.get_member_donation_summary(donation['member_id'])
+                    with st.expander(f"{member_name(member_labels, donation['member_id'])} - {donation['amount']:,.0f} gil"):
                         st.write(f"Total Lifetime Donations: {member_summary['total_amount']:,.0f} gil")
                         st.write(f"Number of Donations: {member_summary['donation_count']}")
-                        st.write(f"First Donation: {member_summary['first_donation']}")
-                        st.write(f"Latest Donation: {member_summary['last_donation']}")
+                        st.write(f"First Donation: {format_date(member_summary['first_donation'])}")
+                        st.write(f"Latest Donation: {format_date(member_summary['last_donation'])}")
                         if pd.notna(donation['notes']) and donation['notes']:
                             st.write(f"Notes: {donation['notes']}")
             else:
@@ -65,53 +190,34 @@ try:
 
         with col2:
             st.subheader("Recent Expenses")
-            expenses = data_manager.get_expenses_list()
-            if not expenses.empty:
-                # Take the 5 most recent expenses regardless of category
-                recent_expenses = expenses.head(5)
-                print(f"Debug: Displaying {len(recent_expenses)} recent expenses")
-
+            # The 5 most recent expenses regardless of category
+            recent_expenses, _ = data_manager.get_expenses_page(limit=5)
+            if not recent_expenses.empty:
                 for idx, expense in recent_expenses.iterrows():
                     # Format timestamp for display
                     timestamp = expense.get('timestamp', '').split('_')[1] if 'timestamp' in expense else ''
-                    time_display = f"{expense['date']} {timestamp[:2]}:{timestamp[2:4]}:{timestamp[4:]}" if timestamp else expense['date']
+                    time_display = f"{format_date(expense['date'])} {timestamp[:2]}:{timestamp[2:4]}:{timestamp[4:]}" if timestamp else format_date(expense['date'])
 
                     # Create header with optional recipient and returned status
                     header = (f"{time_display} - {expense['category']} - {expense['amount']:,.0f} gil" +
-                              (f" - {expense['recipient']}" if expense['category'] == 'Housing' and pd.notna(expense['recipient']) else "") +
-                              (" (Returned)" if "Gil Returned" in str(expense['description']) else ""))
+                              (f" - {member_name(member_labels, expense['recipient_id'])}" if expense['category'] == 'Housing' and pd.notna(expense['recipient_id']) else "") +
+                              returned_label(expense))
 
                     with st.expander(header):
                         st.write(f"Description: {expense['description']}")
                         st.write(f"Category: {expense['category']}")
-                        st.write(f"Approved by: {expense['approved_by']}")
-                        if expense['category'] == 'Housing' and pd.notna(expense['recipient']):
-                            st.write(f"Recipient: {expense['recipient']}")
-                        st.write(f"Date: {expense['date']}")
-
-                        # Only show return button if description doesn't indicate gil was already returned
-                        if "Gil Returned" not in str(expense['description']):
-                            if st.button("💰 Return Gil", key=f"return_dashboard_{expense['timestamp']}"):
-                                if data_manager.return_expense_gil(
-                                    expense['date'],
-                                    expense['amount'],
-                                    expense['description'],
-                                    expense['approved_by'],
-                                    expense['timestamp']
-                                ):
-                                    st.success(f"{expense['amount']:,.0f} gil returned to FC balance!")
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to return gil")
-
-                        # Delete expense with unique timestamp key
-                        if st.button("🗑️ Delete", key=f"delete_dashboard_{expense['timestamp']}"):
-                            if data_manager.delete_expense(
-                                expense['date'],
-                                expense['amount'],
-                                expense['description'],
-                                expense['timestamp']
-                            ):
+                        st.write(f"Approved by: {member_name(member_labels, expense['approved_by_id'])}")
+                        if expense['category'] == 'Housing' and pd.notna(expense['recipient_id']):
+                            st.write(f"Recipient: {member_name(member_labels, expense['recipient_id'])}")
+                        st.write(f"Date: {format_date(expense['date'])}")
+
+                        # Only offer a return while some of the gil is still outstanding
+                        if expense.get('status') != EXPENSE_RETURNED:
+                            return_gil_controls(data_manager, expense, f"dashboard_{expense['id']}")
+
+                        # Delete expense, keyed by its record id
+                        if st.button("🗑️ Delete", key=f"delete_dashboard_{expense['id']}"):
+                            if data_manager.delete_expense(expense['id']):
                                 st.success("Expense deleted successfully!")
                                 st.rerun()
                             else:
@@ -124,8 +230,7 @@ try:
         st.subheader("FC Donations")
 
         with st.expander("➕ Add New Donation"):
-            members = data_manager.get_all_members()
-            donor = st.selectbox("Select Member", members['name'].tolist(), key="donor_select_new_donation")
+            donor = member_select(data_manager, "Select Member", key="donor_select_new_donation")
             amount = st.number_input("Donation Amount (gil)", min_value=0, value=0, key="amount_input_new_donation")
             notes = st.text_area("Notes", key="notes_input_new_donation")
 
@@ -139,45 +244,29 @@ try:
                 else:
                     st.error("Please fill in all required fields")
 
-        # Show donation history
-        donations = data_manager.get_donations()
-        if not donations.empty:
+        # Show donation history, one page of members at a time
+        offset, limit = page_window("donations")
+        member_totals, member_count = data_manager.get_donation_summaries_page(offset, limit)
+        if member_count:
             st.subheader("Donation History")
-
-            # Get unique members and their donation summaries
-            unique_members = donations['member_name'].unique()
-            member_totals = []
-            for member in unique_members:
-                summary = data_manager.get_member_donation_summary(member)
-                if summary:
-                    member_totals.append({
-                        'member_name': member,
-                        'total_amount': summary['total_amount'],
-                        'summary': summary
-                    })
-
-            # Sort members by total donation amount (highest to lowest)
-            member_totals.sort(key=lambda x: x['total_amount'], reverse=True)
+            pager("donations", member_count)
 
             # Display sorted donations
-            for member_data in member_totals:
-                member = member_data['member_name']
-                summary = member_data['summary']
+            for member_id, summary in member_totals:
 
-                with st.expander(f"{member} - Total: {summary['total_amount']:,.0f} gil ({summary['donation_count']} donations)"):
-                    st.write(f"First Donation: {summary['first_donation']}")
-                    st.write(f"Last Donation: {summary['last_donation']}")
+                with st.expander(f"{member_name(member_labels, member_id)} - Total: {summary['total_amount']:,.0f} gil ({summary['donation_count']} donations)"):
+                    st.write(f"First Donation: {format_date(summary['first_donation'])}")
+                    st.write(f"Last Donation: {format_date(summary['last_donation'])}")
 
                     # Shared notes for all member's donations
-                    sample_donation = summary['donations'][0]
                     new_notes = st.text_area(
                         "Notes (applies to all donations)",
-                        value=sample_donation['notes'] if pd.notna(sample_donation['notes']) else "",
-                        key=f"notes_{member}"
+                        value=summary['notes'] if pd.notna(summary['notes']) else "",
+                        key=f"notes_{member_id}"
                     )
 
-                    if st.button("Update Notes", key=f"update_{member}"):
-                        if data_manager.update_member_donations_notes(member, new_notes):
+                    if st.button("Update Notes", key=f"update_{member_id}"):
+                        if data_manager.update_member_donations_notes(member_id, new_notes):
                             st.success("Notes updated successfully!")
                             st.rerun()
                         else:
@@ -186,14 +275,19 @@ try:
                     st.write("---")
                     st.write("Donation History:")
 
-                    # Show individual donations without individual notes
-                    for donation in summary['donations']:
+                    # Show one page of individual donations without individual notes
+                    member_offset, member_limit = page_window(f"donations_{member_id}")
+                    donations, donation_count = data_manager.get_member_donations_page(
+                        member_id, member_offset, member_limit
+                    )
+                    pager(f"donations_{member_id}", donation_count)
+                    for donation in donations.to_dict('records'):
                         col1, col2 = st.columns([3, 1])
                         with col1:
-                            st.write(f"Amount: {donation['amount']:,.0f} gil - Date: {donation['date']}")
+                            st.write(f"Amount: {donation['amount']:,.0f} gil - Date: {format_date(donation['date'])}")
                         with col2:
-                            if st.button("🗑️ Delete", key=f"delete_{donation['timestamp']}", type="secondary"):
-                                if data_manager.delete_donation(donation['timestamp']):
+                            if st.button("🗑️ Delete", key=f"delete_{donation['id']}", type="secondary"):
+                                if data_manager.delete_donation(donation['id']):
                                     st.success("Donation deleted successfully!")
                                     st.rerun()
                                 else:
@@ -206,8 +300,7 @@ try:
         st.subheader("Housing Lotto Numbers")
 
         with st.expander("➕ Record New Lotto Number"):
-            members = data_manager.get_all_members()
-            bid_member = st.selectbox("Select Member", members['name'].tolist(), key="bid_member")
+            bid_member = member_select(data_manager, "Select Member", key="bid_member")
             bid_number = st.number_input("Lotto Number", min_value=1, value=1)
 
             if st.button("Record Lotto Number"):
@@ -218,30 +311,32 @@ try:
                 else:
                     st.error("Please fill in all required fields")
 
-        bids = pd.read_csv("data/bids.csv")
-        if not bids.empty:
+        offset, limit = page_window("bids")
+        bids, bid_count = data_manager.get_bids_page(offset, limit)
+        if bid_count:
             st.subheader("All Lotto Numbers")
-            for _, bid in bids.sort_values(['date', 'bid_number'], ascending=[False, True]).iterrows():
-                with st.expander(f"Lotto #{bid['bid_number']} - {bid['member_name']}"):
-                    st.write(f"Date: {bid['date']}")
+            pager("bids", bid_count)
+            for _, bid in bids.iterrows():
+                with st.expander(f"Lotto #{bid['bid_number']} - {member_name(member_labels, bid['member_id'])}"):
+                    st.write(f"Date: {format_date(bid['date'])}")
 
                     # Edit lotto number
                     new_number = st.number_input("Edit Lotto Number",
                                                  min_value=1,
                                                  value=int(bid['bid_number']),
-                                                 key=f"edit_{bid['date']}_{bid['bid_number']}"
+                                                 key=f"edit_{bid['id']}"
                                                  )
-                    if st.button("Update Number", key=f"update_{bid['date']}_{bid['bid_number']}"):
-                        data_manager.update_bid_number(bid['member_name'], bid['bid_number'], bid['date'], new_number)
+                    if st.button("Update Number", key=f"update_{bid['id']}"):
+                        data_manager.update_bid_number(bid['id'], new_number)
                         st.success("Lotto number updated successfully!")
                         st.rerun()
 
                     # Delete lotto number
                     if st.button("🗑️ Delete Lotto Number",
-                                 key=f"delete_{bid['date']}_{bid['bid_number']}",
+                                 key=f"delete_{bid['id']}",
                                  type="secondary"
                                  ):
-                        data_manager.delete_bid(bid['member_name'], bid['bid_number'], bid['date'])
+                        data_manager.delete_bid(bid['id'])
                         st.success("Lotto number deleted successfully!")
                         st.rerun()
         else:
@@ -260,12 +355,12 @@ try:
                 help="Select the type of expense"
             )
             description = st.text_area("Description")
-            approved_by = st.selectbox("Approved By", data_manager.get_all_members()['name'].tolist())
+            approved_by = member_select(data_manager, "Approved By")
 
             # Only show recipient for Housing category
             recipient = None
             if category == "Housing":
-                recipient = st.selectbox("Gil Recipient", data_manager.get_all_members()['name'].tolist())
+                recipient = member_select(data_manager, "Gil Recipient")
 
             if st.button("Record Expense"):
                 if amount > 0 and description and approved_by:
@@ -293,26 +388,28 @@ try:
             ["All Categories"] + data_manager.expense_categories
         )
 
-        expenses = data_manager.get_expenses_list()
-        if not expenses.empty:
-            if selected_category != "All Categories":
-                expenses = expenses[expenses['category'] == selected_category]
+        offset, limit = page_window("expenses")
+        expenses, expense_count = data_manager.get_expenses_page(
+            offset, limit, category=None if selected_category == "All Categories" else selected_category
+        )
+        if expense_count:
+            pager("expenses", expense_count)
 
-            for idx, expense in expenses.sort_values('timestamp', ascending=False).iterrows():
-                unique_key = f"{expense['date']}_{expense['amount']}_{idx}"
+            for _, expense in expenses.iterrows():
+                unique_key = expense['id']
 
                 # Create header with optional recipient and returned status
-                header = (f"{expense['date']} - {expense['category']} - {expense['amount']:,.0f} gil" +
-                         (f" - {expense['recipient']}" if expense['category'] == 'Housing' and pd.notna(expense['recipient']) else "") +
-                         (" (Returned)" if "Gil Returned" in str(expense['description']) else ""))
+                header = (f"{format_date(expense['date'])} - {expense['category']} - {expense['amount']:,.0f} gil" +
+                         (f" - {member_name(member_labels, expense['recipient_id'])}" if expense['category'] == 'Housing' and pd.notna(expense['recipient_id']) else "") +
+                         returned_label(expense))
 
                 with st.expander(header):
                     st.write(f"Amount: {expense['amount']:,.0f} gil")
                     st.write(f"Category: {expense['category']}")
-                    st.write(f"Approved by: {expense['approved_by']}")
-                    if expense['category'] == 'Housing' and pd.notna(expense['recipient']):
-                        st.write(f"Recipient: {expense['recipient']}")
-                    st.write(f"Date: {expense['date']}")
+                    st.write(f"Approved by: {member_name(member_labels, expense['approved_by_id'])}")
+                    if expense['category'] == 'Housing' and pd.notna(expense['recipient_id']):
+                        st.write(f"Recipient: {member_name(member_labels, expense['recipient_id'])}")
+                    st.write(f"Date: {format_date(expense['date'])}")
 
                     # Update description with unique key
                     new_description = st.text_area(
@@ -321,42 +418,23 @@ try:
                         key=f"desc_{unique_key}"
                     )
                     if st.button("Update Description", key=f"update_{unique_key}"):
-                        if data_manager.update_expense_notes(
-                            expense['date'],
-                            expense['amount'],
-                            expense['description'],
-                            new_description,
-                            expense['timestamp']
-                        ):
+                        if data_manager.update_expense_notes(expense['id'], new_description):
                             st.success("Description updated successfully!")
                             st.rerun()
                         else:
                             st.error("Failed to update description")
 
+                    if pd.notna(expense.get('returned_date')):
+                        st.write(f"Returned: {expense['returned_amount']:,.0f} gil on {format_date(expense['returned_date'])}")
+
                     # Return Gil button and Delete expense button side by side
-                    if "Gil Returned" not in str(expense['description']):
+                    if expense.get('status') != EXPENSE_RETURNED:
                         col1, col2 = st.columns(2)
                         with col1:
-                            if st.button("💰 Return Gil", key=f"return_{unique_key}", type="primary"):
-                                if data_manager.return_expense_gil(
-                                    expense['date'],
-                                    expense['amount'],
-                                    expense['description'],
-                                    expense['approved_by'],
-                                    expense['timestamp']
-                                ):
-                                    st.success(f"{expense['amount']:,.0f} gil returned to FC balance!")
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to return gil")
+                            return_gil_controls(data_manager, expense, unique_key)
                         with col2:
                             if st.button("🗑️ Delete Expense", key=f"delete_{unique_key}", type="secondary"):
-                                if data_manager.delete_expense(
-                                    expense['date'],
-                                    expense['amount'],
-                                    expense['description'],
-                                    expense['timestamp']
-                                ):
+                                if data_manager.delete_expense(expense['id']):
                                     st.success("Expense deleted successfully!")
                                     st.rerun()
                                 else:
@@ -364,12 +442,7 @@ try:
                     else:
                         # Only show delete button if gil is already returned
                         if st.button("🗑️ Delete Expense", key=f"delete_{unique_key}", type="secondary"):
-                            if data_manager.delete_expense(
-                                expense['date'],
-                                expense['amount'],
-                                expense['description'],
-                                expense['timestamp']
-                            ):
+                            if data_manager.delete_expense(expense['id']):
                                 st.success("Expense deleted successfully!")
                                 st.rerun()
                             else:
@@ -384,15 +457,14 @@ try:
         col1, col2 = st.columns([2, 3])
 
         with col1:
-            if st.button("🔄 Sync Members from Lodestone"):
-                with st.spinner("Syncing members from Lodestone..."):
-                    members_count = data_manager.sync_members_from_lodestone()
-                    if members_count > 0:
-                        st.success(f"Updated member list with {members_count} members from Lodestone!")
-                    else:
-                        st.error("Failed to sync members from Lodestone")
+            member_sync = data_manager.get_member_sync_status()
+            if st.button("🔄 Sync Members from Lodestone", disabled=member_sync['running']):
+                data_manager.sync_members_async()
                 st.rerun()
 
+            # Polls the sync while it runs, then reruns the page to show the new roster
+            st.fragment(member_sync_status, run_every=2 if member_sync['running'] else None)(st.session_state.fc_id)
+
             search_term = st.text_input("🔍 Search Members")
 
             members = data_manager.get_all_members()
@@ -404,7 +476,8 @@ try:
             if not filtered_members.empty:
                 selected_member = st.selectbox(
                     "Select a member to view details",
-                    filtered_members['name'].tolist(),
+                    filtered_members['member_id'].tolist(),
+                    format_func=member_labels.get,
                     key="member_selector"
                 )
             else:
@@ -412,8 +485,9 @@ try:
                 selected_member = None
 
         with col2:
-            if selected_member:
-                st.subheader(f"Member Details: {selected_member}")
+            if selected_member is not None:
+                selected_name = member_name(member_labels, selected_member)
+                st.subheader(f"Member Details: {selected_name}")
 
                 # Add delete member button with proper state management
                 if f"delete_confirm_{selected_member}" not in st.session_state:
@@ -424,12 +498,12 @@ try:
                         st.session_state[f"delete_confirm_{selected_member}"] = True
                         st.rerun()
                 else:
-                    st.warning(f"Are you sure you want to delete {selected_member}? This cannot be undone.")
+                    st.warning(f"Are you sure you want to delete {selected_name}? This cannot be undone.")
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button("⚠️ Yes, Delete", key=f"confirm_delete_{selected_member}"):
                             if data_manager.delete_member(selected_member):
-                                st.success(f"Member {selected_member} deleted successfully!")
+                                st.success(f"Member {selected_name} deleted successfully!")
                                 st.session_state[f"delete_confirm_{selected_member}"] = False
                                 st.rerun()
                             else:
@@ -445,7 +519,7 @@ try:
                     st.write("Housing Bids:")
                     for _, bid in member_bids.iterrows():
                         with st.expander(f"Housing Bid #{bid['bid_number']}"):
-                            st.write(f"Date: {bid['date']}")
+                            st.write(f"Date: {format_date(bid['date'])}")
 
                 # Show donations
                 member_donations = data_manager.get_member_donations(selected_member)
@@ -454,26 +528,27 @@ try:
                     total_donations = member_donations['amount'].sum()
                     st.metric("Total Donations", f"{total_donations:,.0f} gil")
                     for _, donation in member_donations.iterrows():
-                        st.write(f"Amount: {donation['amount']:,.0f} gil - Date: {donation['date']}")
+                        st.write(f"Amount: {donation['amount']:,.0f} gil - Date: {format_date(donation['date'])}")
                 else:
                     st.info("No donations recorded")
 
     # Footer
     st.markdown("---")
-    st.markdown("<p style='text-align: center'>Lotus Free Company</p>", unsafe_allow_html=True)
+    st.markdown(f"<p style='text-align: center'>{html.escape(fcs[st.session_state.fc_id])} Free Company</p>",
+                unsafe_allow_html=True)
 
     col1, spacer, col2 = st.columns([1, 2, 1])
     with col1:
         if st.button("📥 Export", key="export_btn", type="secondary", use_container_width=True):
-            zip_path = data_manager.export_data_to_zip()
-            if zip_path:
-                with open(zip_path, 'rb') as f:
-                    st.download_button(
-                        label="Download Data",
-                        data=f,
-                        file_name=os.path.basename(zip_path),
-                        mime="application/zip"
-                    )
+            export = data_manager.export_data_to_zip()
+            if export:
+                file_name, data = export
+                st.download_button(
+                    label="Download Data",
+                    data=data,
+                    file_name=file_name,
+                    mime="application/zip"
+                )
             else:
                 st.error("Failed to export data")
 
@@ -492,4 +567,7 @@ try:
 
 except Exception as e:
     st.error(f"Error initializing application: {str(e)}")
-    st.info("If this error persists, please contact support.")
\ No newline at end of file
+    st.info("If this error persists, please contact support.")
+finally:
+    if data_manager is not None:
+        DataManager.release(data_manager)
@@ -0,0 +1,277 @@
+import os
+from datetime import datetime
+import pandas as pd
+from record_ids import new_record_id
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# The schema version of a data directory is kept in this file
+SCHEMA_VERSION_FILE = "schema_version"
+
+# Ordered list of (version, description, function); each function takes a storage backend
+MIGRATIONS = []
+
+# Tables the migrations know about
+TABLES = ('members', 'donations', 'expenses', 'bids')
+
+
+def migration(version, description):
+    """Register a schema migration step"""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return register
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def read_schema_version(data_dir):
+    """Return the schema version recorded in a data directory, or None without a version file"""
+    try:
+        with open(os.path.join(data_dir, SCHEMA_VERSION_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return None
+
+
+def infer_schema_version(frames):
+    """Best guess at the schema version of tables saved without one
+
+    Used for old archives and backups, and for data directories that lost
+    their version file. Columns that were only added empty (ensure_table
+    adds every current column) don't count, so a legacy table never passes
+    for a migrated one. Every migration is safe to re-run, so guessing too
+    low does no harm.
+    """
+    def filled(table, column):
+        df = frames.get(table)
+        return df is not None and column in df.columns and bool(df[column].notna().all())
+
+    if not all(filled(table, 'id') for table in TABLES):
+        # Migrations 1-3 only fill in what's missing, so they're safe to re-run
+        return 0
+    if not filled('expenses', 'status'):
+        return 4
+    return 6 if _uses_member_ids(frames) else 5
+
+
+def stored_schema_version(storage):
+    """Infer the schema version of the tables in a storage backend"""
+    return infer_schema_version({table: storage.read(table) for table in TABLES if storage.exists(table)})
+
+
+def current_schema_version(storage, data_dir):
+    """Schema version of a data directory, inferred from its tables when the version file is missing"""
+    version = read_schema_version(data_dir)
+    if version is None:
+        version = stored_schema_version(storage)
+        logger.info("No schema version file in %s; inferred version %d from the tables", data_dir, version)
+    return version
+
+
+def write_schema_version(data_dir, version):
+    path = os.path.join(data_dir, SCHEMA_VERSION_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(f"{version}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def run_migrations(storage, data_dir):
+    """Apply every migration newer than the data directory's schema version
+
+    Returns the versions that were applied. Once a directory is current
+    this only reads the version file. Without one the version is inferred
+    from the tables, so already migrated data isn't migrated again.
+    """
+    current = read_schema_version(data_dir)
+    if current is None:
+        current = current_schema_version(storage, data_dir)
+        write_schema_version(data_dir, current)
+    applied = []
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info("Applying schema migration %d: %s", version, description)
+        func(storage)
+        write_schema_version(data_dir, version)
+        applied.append(version)
+    return applied
+
+
+@migration(1, "create tables and add missing columns")
+def _create_tables(storage):
+    # Frozen copy of the table layout at the time this step was written
+    columns = {
+        'members': ['name', 'join_date', 'left_date'],
+        'donations': ['member_name', 'amount', 'date', 'notes', 'timestamp'],
+        'expenses': ['date', 'amount', 'description', 'category', 'approved_by', 'recipient', 'timestamp'],
+        'bids': ['member_name', 'bid_number', 'date'],
+    }
+    for table, table_columns in columns.items():
+        storage.ensure_table(table, table_columns)
+
+
+def _backfill_timestamps(storage, table, width):
+    df = storage.read(table)
+    missing = df['timestamp'].isna()
+    if not missing.any():
+        return
+    row_numbers = [f"{i:0{width}d}" for i in df.index[missing.to_numpy()]]
+    df.loc[missing, 'timestamp'] = df.loc[missing, 'date'].astype(str) + '_' + row_numbers
+    storage.write(table, df)
+    logger.info("Backfilled %d %s timestamps", int(missing.sum()), table)
+
+
+@migration(2, "backfill missing donation timestamps")
+def _backfill_donation_timestamps(storage):
+    _backfill_timestamps(storage, 'donations', 3)
+
+
+@migration(3, "backfill missing expense timestamps")
+def _backfill_expense_timestamps(storage):
+    _backfill_timestamps(storage, 'expenses', 6)
+
+
+@migration(4, "give every record a unique id")
+def _add_record_ids(storage):
+    for table in TABLES:
+        df = storage.read(table)
+        added_column = 'id' not in df.columns
+        if added_column:
+            df.insert(0, 'id', None)
+        missing = df['id'].isna()
+        if not missing.any() and not added_column:
+            continue
+        # ULIDs are monotonic, so ids follow the existing row order
+        df['id'] = df['id'].astype(object)
+        df.loc[missing, 'id'] = [new_record_id() for _ in range(int(missing.sum()))]
+        storage.write(table, df)
+        logger.info("Assigned ids to %d %s rows", int(missing.sum()), table)
+
+
+@migration(5, "track returned expense gil in status columns")
+def _add_expense_status(storage):
+    df = storage.read('expenses')
+    added = [column for column in ('status', 'returned_amount', 'returned_date') if column not in df.columns]
+    for column in added:
+        df[column] = None
+    # Only rows without a status yet; the others already track their returns
+    pending = df['status'].isna()
+    if not pending.any() and not added:
+        return
+    # Returns used to be recorded by appending this marker to the description
+    marker = r'\s*\(Gil Returned\)'
+    descriptions = df.loc[pending, 'description']
+    returned = descriptions.fillna('').astype(str).str.contains(marker, regex=True)
+    df['status'] = df['status'].astype(object)
+    df.loc[pending, 'status'] = returned.map({True: 'returned', False: 'active'})
+    df['returned_amount'] = df['returned_amount'].astype(object)
+    df.loc[pending, 'returned_amount'] = df.loc[pending, 'amount'].where(returned, 0)
+    # The old marker didn't record when the gil came back, so returned_date stays empty
+    df['description'] = df['description'].astype(object)
+    df.loc[pending, 'description'] = (
+        descriptions.fillna('').astype(str).str.replace(marker, '', regex=True).where(descriptions.notna(), None)
+    )
+    storage.write('expenses', df)
+    logger.info("Marked %d of %d expenses as returned", int(returned.sum()), int(pending.sum()))
+
+
+def _split_member(value):
+    """Split a legacy "Name\nWorld" member string into a (name, world) key"""
+    if value is None or pd.isna(value):
+        return None
+    name, _, world = str(value).strip().partition('\n')
+    return ' '.join(name.split()), ' '.join(world.split()) or None
+
+
+# Member name columns that migration 6 replaced with member id columns
+MEMBER_NAME_COLUMNS = {
+    'donations': {'member_name': 'member_id'},
+    'bids': {'member_name': 'member_id'},
+    'expenses': {'approved_by': 'approved_by_id', 'recipient': 'recipient_id'},
+}
+
+
+def _uses_member_ids(frames):
+    """Whether every member has an id and no record still refers to a member by name"""
+    members = frames.get('members')
+    if members is None or 'member_id' not in members.columns or members['member_id'].isna().any():
+        return False
+    for table, columns in MEMBER_NAME_COLUMNS.items():
+        df = frames.get(table)
+        if df is None:
+            return False
+        for old, new in columns.items():
+            if new not in df.columns or (old in df.columns and df[old].notna().any()):
+                return False
+    return True
+
+
+@migration(6, "reference members by integer id with separate name and world")
+def _add_member_ids(storage):
+    tables = {table: storage.read(table) for table in TABLES}
+    if _uses_member_ids(tables):
+        # Already migrated: the name columns are gone, or only came back empty
+        # (migration 1 adds them), and the ids can't be rebuilt from them
+        leftover = {
+            table: tables[table].drop(columns=list(columns), errors='ignore')
+            for table, columns in MEMBER_NAME_COLUMNS.items() if set(columns) & set(tables[table].columns)
+        }
+        if leftover:
+            storage.commit_tables(leftover)
+        return
+
+    # ensure_table may already have added the new columns, empty, when the
+    # tables were created with the current layout (e.g. CSV -> SQLite)
+    members = storage.read('members').drop(columns=['member_id', 'world'], errors='ignore')
+    members = members[members['name'].notna()].reset_index(drop=True)
+    keys = members['name'].map(_split_member)
+    # The same member stored twice (e.g. differing only in whitespace) keeps
+    # one row, preferring the one that is still active
+    order = members['left_date'].notna().sort_values(kind='stable').index
+    duplicated = keys.loc[order].duplicated().reindex(members.index)
+    if duplicated.any():
+        logger.info("Merged %d duplicate member rows", int(duplicated.sum()))
+    members, keys = members[~duplicated].reset_index(drop=True), keys[~duplicated].tolist()
+    ids = {key: member_id for member_id, key in enumerate(keys, start=1)}
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    orphans = []
+
+    def member_ids(values):
+        result = []
+        for key in values.map(_split_member):
+            if key is not None and key not in ids:
+                # Named in a record but missing from the roster: keep them as a former member
+                ids[key] = len(ids) + 1
+                orphans.append({'id': new_record_id(), 'member_id': ids[key], 'name': key[0], 'world': key[1],
+                                'join_date': None, 'left_date': today})
+            result.append(None if key is None else ids[key])
+        return pd.array(result, dtype='Int64')
+
+    frames = {}
+    for table, columns in MEMBER_NAME_COLUMNS.items():
+        df = storage.read(table).drop(columns=list(columns.values()), errors='ignore')
+        for old, new in columns.items():
+            df.insert(df.columns.get_loc(old), new, member_ids(df[old]))
+            df = df.drop(columns=old)
+        frames[table] = df
+
+    members.insert(members.columns.get_loc('name'), 'member_id', range(1, len(members) + 1))
+    members['name'] = [key[0] for key in keys]
+    members.insert(members.columns.get_loc('name') + 1, 'world', [key[1] for key in keys])
+    if orphans:
+        members = pd.concat([members, pd.DataFrame(orphans, columns=members.columns)], ignore_index=True)
+        logger.info("Added %d former members named only in records", len(orphans))
+    frames['members'] = members
+
+    # Every table changes shape, so they're replaced together
+    storage.commit_tables(frames)
+    logger.info("Assigned member ids to %d members", len(members))
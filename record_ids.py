@@ -0,0 +1,41 @@
+import os
+import threading
+import time
+
+# Crockford base32, as used by ULIDs
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(_ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def new_record_id():
+    """Return a new monotonic ULID (26 chars, sortable by creation time)
+
+    IDs created in the same millisecond increment the random part, so
+    they stay unique and ordered even when many records are added at once.
+    """
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms <= _last_ms:
+            now_ms = _last_ms
+            _last_random += 1
+            if _last_random >= 1 << 80:
+                # Random part exhausted within one millisecond; borrow the next one
+                now_ms += 1
+                _last_random = int.from_bytes(os.urandom(10), 'big') >> 1
+        else:
+            # Keep the top bit clear so increments have room before overflowing
+            _last_random = int.from_bytes(os.urandom(10), 'big') >> 1
+        _last_ms = now_ms
+        return _encode(now_ms, 10) + _encode(_last_random, 16)
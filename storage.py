@@ -0,0 +1,839 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from table_cache import TableCache
+from table_lock import TableLocks, atomic_write
+from table_schema import DATE_FORMAT, apply_schema, coerce_row, to_stored
+from table_snapshot import open_snapshots
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Default column layout of every ledger table
+TABLE_COLUMNS = {
+    'members': ['id', 'member_id', 'name', 'world', 'join_date', 'left_date'],
+    'donations': ['id', 'member_id', 'amount', 'date', 'notes', 'timestamp'],
+    'expenses': ['id', 'date', 'amount', 'description', 'category', 'approved_by_id', 'recipient_id', 'timestamp',
+                 'status', 'returned_amount', 'returned_date'],
+    'bids': ['id', 'member_id', 'bid_number', 'date'],
+}
+
+# Columns that get an index in the SQLite backend when a table has them
+INDEXED_COLUMNS = ['id', 'member_id', 'timestamp', 'date']
+
+# Lists the tables of a CSV transaction that is being committed
+JOURNAL_FILE = "transaction.journal"
+
+
+def _to_python(value):
+    """Convert numpy/pandas scalars into plain Python values"""
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple, dict)) and pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _match(df, criteria):
+    """Build a boolean mask selecting rows where every column equals its value"""
+    mask = pd.Series(True, index=df.index)
+    for column, value in criteria.items():
+        # Nullable columns compare missing values as NA; those rows don't match
+        mask &= (df[column] == value).fillna(False).astype(bool)
+    return mask
+
+
+class Transaction:
+    """Changes to several tables, staged in memory and committed together
+
+    Tables are only read when a change may touch them and only written
+    when one actually did.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._frames = {}
+
+    def read(self, table):
+        """Read a table including the changes staged so far"""
+        staged = self._frames.get(table)
+        return staged.copy() if staged is not None else self.storage.read(table)
+
+    def append(self, table, row):
+        df = self.read(table)
+        self._frames[table] = pd.concat([df, pd.DataFrame([row], columns=df.columns)], ignore_index=True)
+
+    def delete_where(self, table, **criteria):
+        """Stage deleting the matching rows and return how many there are"""
+        if table not in self._frames and not self.storage.count_where(table, **criteria):
+            return 0
+        df = self.read(table)
+        mask = _match(df, criteria)
+        removed = int(mask.sum())
+        if removed:
+            self._frames[table] = df[~mask]
+        return removed
+
+    def update_where(self, table, values, **criteria):
+        """Stage setting column values on the matching rows and return how many there are"""
+        if table not in self._frames and not self.storage.count_where(table, **criteria):
+            return 0
+        df = self.read(table)
+        mask = _match(df, criteria)
+        updated = int(mask.sum())
+        if updated:
+            for column, value in values.items():
+                _assign(df, mask, column, value)
+            self._frames[table] = df
+        return updated
+
+    def delete_by_id(self, table, record_id):
+        return self.delete_where(table, id=record_id)
+
+    def update_by_id(self, table, record_id, values):
+        return self.update_where(table, values, id=record_id)
+
+    def commit(self):
+        """Write every changed table at once and return their names"""
+        tables = sorted(self._frames)
+        if tables:
+            self.storage.commit_tables(self._frames)
+        self._frames = {}
+        return tables
+
+
+class SqliteTransaction:
+    """Changes to several tables, run as SQL inside one open SQLite transaction
+
+    Has the interface of Transaction; SqliteStorage.transaction() commits
+    or rolls back.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.tables = set()
+
+    def read(self, table):
+        """Read a table including the changes made so far"""
+        return self.storage.read(table)
+
+    def append(self, table, row):
+        self.storage._insert(table, coerce_row(table, row))
+        self.tables.add(table)
+
+    def delete_where(self, table, **criteria):
+        """Delete the matching rows and return how many there were"""
+        self.tables.add(table)
+        return self.storage._delete(table, criteria)
+
+    def update_where(self, table, values, **criteria):
+        """Set column values on the matching rows and return how many there were"""
+        self.tables.add(table)
+        return self.storage._update(table, coerce_row(table, values), criteria)
+
+    def delete_by_id(self, table, record_id):
+        return self.delete_where(table, id=record_id)
+
+    def update_by_id(self, table, record_id, values):
+        return self.update_where(table, values, id=record_id)
+
+
+@contextmanager
+def _transaction(storage, tables):
+    # The locks are held from the first read to the commit, so staged
+    # changes can't be based on stale rows
+    with storage.lock(*tables):
+        txn = Transaction(storage)
+        yield txn
+        txn.commit()
+
+
+def _sort_order(df, positions, order_by):
+    """Stable ordering of the rows at positions by (column, descending) keys, missing values last"""
+    keys = []
+    for column, descending in order_by:
+        codes, uniques = pd.factorize(df[column].take(positions), sort=True)
+        key = -codes if descending else codes
+        key[codes < 0] = len(uniques)
+        keys.append(key)
+    # np.lexsort is stable and takes its primary key last
+    return np.lexsort(keys[::-1])
+
+
+def _assign(df, rows, column, value):
+    """Set df.loc[rows, column], widening the column if its dtype can't hold the value"""
+    try:
+        df.loc[rows, column] = value
+    except (TypeError, ValueError):
+        # e.g. a date written into a column that so far only held NaN (float64)
+        df[column] = df[column].astype(object)
+        df.loc[rows, column] = value
+
+
+class CsvStorage:
+    """Storage backend that keeps each table in a CSV file"""
+
+    name = 'csv'
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        # Tables are parsed into their schema dtypes once, when the file changes;
+        # with pyarrow installed, cold reads come from columnar snapshots
+        self.cache = TableCache(prepare=self._prepare, date_format=DATE_FORMAT,
+                                snapshots=open_snapshots(data_dir))
+        # Writers hold a table's lock (threads and other processes alike)
+        self.locks = TableLocks(data_dir)
+        # table -> (version, {record id: row position})
+        self._id_index = {}
+        self._id_lock = threading.Lock()
+
+    def path(self, table):
+        """Return the CSV path of a table"""
+        return os.path.join(self.data_dir, f"{table}.csv")
+
+    def lock(self, *tables):
+        """Hold the write locks of tables across several operations"""
+        return self.locks.hold(*tables)
+
+    @staticmethod
+    def _prepare(path, df):
+        return apply_schema(os.path.splitext(os.path.basename(path))[0], df)
+
+    def ensure_table(self, table, columns):
+        """Create the table if needed and add any missing columns"""
+        with self.lock(table):
+            self._ensure_table(table, columns)
+
+    def _ensure_table(self, table, columns):
+        file_path = self.path(table)
+        if not os.path.exists(file_path):
+            # Create new empty DataFrame with columns
+            self.cache.write(file_path, apply_schema(table, pd.DataFrame(columns=columns), strict=True))
+            logger.info("Created new file: %s", file_path)
+            return
+
+        # Try to read existing file
+        try:
+            df = self.cache.read(file_path)
+            if len(df.columns) == 0:  # File exists but is empty
+                df = pd.DataFrame(columns=columns)
+                self.cache.write(file_path, df)
+                logger.info("Reinitialized empty file: %s", file_path)
+        except pd.errors.EmptyDataError:
+            # Handle empty file
+            df = pd.DataFrame(columns=columns)
+            self.cache.write(file_path, df)
+            logger.info("Reinitialized empty file: %s", file_path)
+
+        # Add any missing columns after the existing ones, which are kept
+        missing_cols = [col for col in columns if col not in df.columns]
+        if missing_cols:
+            for col in missing_cols:
+                df[col] = None
+            df = apply_schema(table, df, strict=True)
+            self.cache.write(file_path, df)
+            logger.info("Added missing columns to %s: %s", file_path, set(missing_cols))
+
+    def exists(self, table):
+        """Return whether the table has been created"""
+        return os.path.exists(self.path(table))
+
+    def read(self, table):
+        """Read a whole table"""
+        return self.cache.read(self.path(table))
+
+    def read_columns(self, table, columns):
+        """Read only some columns of a table"""
+        return self.cache.read_columns(self.path(table), list(columns))
+
+    def select(self, table, **criteria):
+        """Read the rows of a table matching column == value criteria"""
+        df = self.read(table)
+        return df[_match(df, criteria)]
+
+    def row_count(self, table):
+        """Return the number of rows in a table"""
+        return self.cache.row_count(self.path(table))
+
+    def count_where(self, table, **criteria):
+        """Return how many rows match the criteria, without copying the table"""
+        df = self.cache.peek(self.path(table))
+        return int(_match(df, criteria).sum())
+
+    def query(self, table, filters=None, order_by=None, offset=0, limit=None):
+        """Return one page of a filtered, ordered table and the total matching row count
+
+        order_by is a list of (column, descending) pairs; ties keep file order
+        and missing values sort last. Only row positions and the order-by
+        columns are sorted; the page's rows are the only ones copied out of
+        the cache.
+        """
+        df = self.cache.peek(self.path(table))
+        positions = np.flatnonzero(_match(df, filters).to_numpy()) if filters else np.arange(len(df))
+        total = len(positions)
+        if order_by:
+            positions = positions[_sort_order(df, positions, order_by)]
+        end = None if limit is None else offset + limit
+        return df.take(positions[offset:end]), total
+
+    def write(self, table, df):
+        """Replace the contents of a table
+
+        Read-modify-write callers hold the table's lock (or use mutate())
+        across the read and the write. Raises ValueError if df doesn't fit
+        the table's schema.
+        """
+        df = apply_schema(table, df, strict=True)
+        with self.lock(table):
+            self.cache.write(self.path(table), df)
+
+    def mutate(self, table, func):
+        """Locked read-modify-write: replace the table with func(df) unless it returns None"""
+        with self.lock(table):
+            result = func(self.read(table))
+            if result is not None:
+                self.write(table, result)
+            return result
+
+    def transaction(self, *tables):
+        """Stage changes to the given tables and commit them together on exit"""
+        return _transaction(self, tables)
+
+    def commit_tables(self, frames):
+        """Replace several tables so that a crash leaves all or none of them changed
+
+        The new files are written next to the old ones, then a journal naming
+        them is written as the commit point and the files are moved into
+        place. recover() finishes (or discards) an interrupted commit.
+        """
+        frames = {table: apply_schema(table, df, strict=True) for table, df in frames.items()}
+        with self.lock(*frames):
+            for table, df in frames.items():
+                atomic_write(f"{self.path(table)}.pending", lambda f, df=df: self.cache.to_csv(df, f))
+            atomic_write(self._journal_path(), lambda f: json.dump(sorted(frames), f))
+            self._roll_forward(frames)
+
+    def _journal_path(self):
+        return os.path.join(self.data_dir, JOURNAL_FILE)
+
+    def _roll_forward(self, frames=None):
+        with open(self._journal_path()) as f:
+            tables = json.load(f)
+        for table in tables:
+            pending = f"{self.path(table)}.pending"
+            if not os.path.exists(pending):
+                continue  # already moved into place before a crash
+            if frames is not None:
+                self.cache.install(self.path(table), pending, frames[table])
+            else:
+                os.replace(pending, self.path(table))
+                self.cache.invalidate(self.path(table))
+        os.remove(self._journal_path())
+
+    def recover(self):
+        """Finish a transaction that was committed but not fully applied, drop unfinished ones"""
+        with self.lock(*TABLE_COLUMNS):
+            if os.path.exists(self._journal_path()):
+                logger.warning("Completing an interrupted transaction")
+                self._roll_forward()
+            for pending in glob.glob(os.path.join(self.data_dir, "*.csv.pending")):
+                os.remove(pending)
+
+    def append(self, table, row):
+        """Append a single row to a table"""
+        row = coerce_row(table, row)
+        with self.lock(table), self._id_lock:
+            version_before = self.version(table)
+            row_count = self.row_count(table)
+            self.cache.append(self.path(table), row)
+            entry = self._id_index.get(table)
+            if entry is not None and entry[0] == version_before and row.get('id') is not None:
+                # Extend the id index instead of rebuilding it
+                entry[1][row['id']] = row_count
+                self._id_index[table] = (self.version(table), entry[1])
+
+    def _positions(self, table, df):
+        """Return the id -> row position index for the table version df was read at"""
+        with self._id_lock:
+            version = self.version(table)
+            entry = self._id_index.get(table)
+            if entry is None or entry[0] != version:
+                positions = {record_id: pos for pos, record_id in enumerate(df['id']) if pd.notna(record_id)}
+                entry = (version, positions)
+                self._id_index[table] = entry
+            return entry[1]
+
+    def get_by_id(self, table, record_id):
+        """Return one record as a dict, or None if no row has that id
+
+        Only the matching row is copied out of the cache.
+        """
+        df = self.cache.peek(self.path(table))
+        pos = self._positions(table, df).get(record_id)
+        return None if pos is None else df.iloc[pos].to_dict()
+
+    def delete_by_id(self, table, record_id):
+        """Delete the row with the given id and return how many were removed"""
+        with self.lock(table):
+            # drop() builds a new frame, so the cached one needn't be copied first
+            df = self.cache.peek(self.path(table))
+            pos = self._positions(table, df).get(record_id)
+            if pos is None:
+                return 0
+            self.write(table, df.drop(index=df.index[pos]))
+            return 1
+
+    def update_by_id(self, table, record_id, values):
+        """Set column values on the row with the given id and return the row count"""
+        with self.lock(table):
+            df = self.read(table)
+            pos = self._positions(table, df).get(record_id)
+            if pos is None:
+                return 0
+            for column, value in values.items():
+                _assign(df, df.index[pos], column, value)
+            self.write(table, df)
+            return 1
+
+    def delete_where(self, table, **criteria):
+        """Delete rows matching the criteria and return how many were removed"""
+        with self.lock(table):
+            df = self.read(table)
+            mask = _match(df, criteria)
+            removed = int(mask.sum())
+            if removed:
+                self.write(table, df[~mask])
+            return removed
+
+    def update_where(self, table, values, **criteria):
+        """Set column values on rows matching the criteria and return the row count"""
+        with self.lock(table):
+            df = self.read(table)
+            mask = _match(df, criteria)
+            updated = int(mask.sum())
+            if updated:
+                for column, value in values.items():
+                    _assign(df, mask, column, value)
+                self.write(table, df)
+            return updated
+
+    def version(self, table):
+        """Return a token that changes whenever the table changes"""
+        return self.cache.signature(self.path(table))
+
+    def reload_from_csv(self):
+        """Pick up CSV files that were replaced on disk"""
+        self.recover()
+        self.cache.invalidate()
+
+    def export_csv(self):
+        """CSV files are already the primary store; nothing to export"""
+        return True
+
+    def stats(self):
+        """Get table cache hit/miss counters"""
+        return self.cache.stats()
+
+    def close(self):
+        self.cache.invalidate()
+
+
+class SqliteStorage:
+    """Storage backend that keeps every table in a single SQLite database
+
+    The database runs in WAL mode so readers never block the writer.
+    Tables are mirrored to CSV files with export_csv() so the git-sync
+    workflow keeps working on plain text files.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, data_dir, db_path=None):
+        self.data_dir = data_dir
+        self.db_path = db_path or os.path.join(data_dir, "fc_data.db")
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # SQLite makes single statements atomic; table locks cover the
+        # multi-step changes callers make (read, compute, write)
+        self.locks = TableLocks(data_dir)
+        # Cached frames are tagged with the table version they were read at
+        self._cache = {}
+        self._writes = {}
+        self.hits = 0
+        self.misses = 0
+        # Signatures of the CSV mirrors as of the last export/import, kept in
+        # the database so a restart doesn't mistake them for outside changes
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS "_csv_mirror" (tbl TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER)'
+            )
+
+    def csv_path(self, table):
+        """Return the path of the CSV mirror of a table"""
+        return os.path.join(self.data_dir, f"{table}.csv")
+
+    def _version(self, table):
+        # data_version changes when another connection commits; our own
+        # commits are tracked by per-table write counters
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return (data_version, self._writes.get(table, 0))
+
+    def version(self, table):
+        """Return a token that changes whenever the table changes"""
+        with self._lock:
+            return self._version(table)
+
+    def _columns(self, table):
+        rows = self._conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        return [row[1] for row in rows]
+
+    def _create_indexes(self, table):
+        for column in self._columns(table):
+            if column in INDEXED_COLUMNS:
+                self._conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")'
+                )
+
+    def _changed(self, table):
+        self._writes[table] = self._writes.get(table, 0) + 1
+
+    def lock(self, *tables):
+        """Hold the write locks of tables across several operations"""
+        return self.locks.hold(*tables)
+
+    def ensure_table(self, table, columns):
+        """Create the table if needed and add any missing columns"""
+        with self.lock(table), self._lock, self._conn:
+            existing = self._columns(table)
+            if not existing:
+                column_defs = ', '.join(f'"{col}"' for col in columns)
+                self._conn.execute(f'CREATE TABLE "{table}" ({column_defs})')
+                logger.info("Created new table: %s", table)
+            else:
+                missing_cols = [col for col in columns if col not in existing]
+                for col in missing_cols:
+                    self._conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{col}"')
+                if missing_cols:
+                    logger.info("Added missing columns to %s: %s", table, set(missing_cols))
+            self._create_indexes(table)
+            self._changed(table)
+
+    def exists(self, table):
+        """Return whether the table has been created"""
+        with self._lock:
+            return bool(self._columns(table))
+
+    def _query(self, sql, params=()):
+        return pd.read_sql_query(sql, self._conn, params=params)
+
+    def read(self, table):
+        """Read a whole table in insertion order"""
+        with self._lock:
+            version = self._version(table)
+            entry = self._cache.get(table)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1].copy()
+            self.misses += 1
+            df = apply_schema(table, self._query(f'SELECT * FROM "{table}" ORDER BY rowid'))
+            self._cache[table] = (version, df)
+            return df.copy()
+
+    def read_columns(self, table, columns):
+        """Read only some columns of a table"""
+        column_list = ', '.join(f'"{col}"' for col in columns)
+        with self._lock:
+            entry = self._cache.get(table)
+            if entry is not None and entry[0] == self._version(table):
+                self.hits += 1
+                return entry[1][list(columns)].copy()
+            return apply_schema(table, self._query(f'SELECT {column_list} FROM "{table}" ORDER BY rowid'))
+
+    @staticmethod
+    def _where(criteria):
+        clause = ' AND '.join(f'"{column}" = ?' for column in criteria)
+        return clause, [_to_python(value) for value in criteria.values()]
+
+    def select(self, table, **criteria):
+        """Read the rows of a table matching column == value criteria"""
+        if not criteria:
+            return self.read(table)
+        clause, params = self._where(criteria)
+        with self._lock:
+            return apply_schema(table, self._query(f'SELECT * FROM "{table}" WHERE {clause} ORDER BY rowid', params))
+
+    def row_count(self, table):
+        """Return the number of rows in a table"""
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+    def count_where(self, table, **criteria):
+        """Return how many rows match the criteria"""
+        clause, params = self._where(criteria)
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM "{table}" WHERE {clause}', params).fetchone()[0]
+
+    def query(self, table, filters=None, order_by=None, offset=0, limit=None):
+        """Return one page of a filtered, ordered table and the total matching row count
+
+        Filtering, ordering and paging all run in SQL.
+        """
+        where, params = self._where(filters) if filters else ('1', [])
+        order = ', '.join(
+            f'"{column}" {"DESC" if descending else "ASC"}' for column, descending in order_by or []
+        )
+        order = f"{order}, rowid" if order else "rowid"
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM "{table}" WHERE {where}', params).fetchone()[0]
+            df = self._query(
+                f'SELECT * FROM "{table}" WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?',
+                params + [-1 if limit is None else limit, offset]
+            )
+        return apply_schema(table, df), total
+
+    def write(self, table, df):
+        """Replace the contents of a table
+
+        The new rows are loaded into a scratch table that is swapped in with
+        one transaction. Raises ValueError if df doesn't fit the table's
+        schema.
+        """
+        df = to_stored(table, apply_schema(table, df, strict=True))
+        with self.lock(table), self._lock:
+            # Object columns get no declared type; TEXT affinity would turn
+            # numbers appended later into strings
+            untyped = {col: '' for col in df.columns if df[col].dtype == object}
+            scratch = f"_{table}_new"
+            df.to_sql(scratch, self._conn, if_exists='replace', index=False, dtype=untyped)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+                self._conn.execute(f'ALTER TABLE "{scratch}" RENAME TO "{table}"')
+                self._create_indexes(table)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._changed(table)
+
+    def mutate(self, table, func):
+        """Locked read-modify-write: replace the table with func(df) unless it returns None"""
+        with self.lock(table):
+            result = func(self.read(table))
+            if result is not None:
+                self.write(table, result)
+            return result
+
+    @contextmanager
+    def transaction(self, *tables):
+        """Change several tables in one SQLite transaction, committed on exit
+
+        Changes run as SQL right away (deletes and updates use the indexed
+        WHERE statements), but other connections only see them once the
+        block exits; an exception rolls all of them back.
+        """
+        with self.lock(*tables), self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            txn = SqliteTransaction(self)
+            try:
+                yield txn
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            finally:
+                # Frames cached during the transaction may hold rolled back rows
+                for table in txn.tables:
+                    self._changed(table)
+
+    def commit_tables(self, frames):
+        """Replace several tables in a single SQLite transaction"""
+        frames = {table: to_stored(table, apply_schema(table, df, strict=True)) for table, df in frames.items()}
+        with self.lock(*frames), self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table, df in frames.items():
+                    if self._columns(table) != list(df.columns):
+                        # New column layout: rebuild the table (DDL is transactional in SQLite)
+                        column_defs = ', '.join(
+                            f'"{col}" INTEGER' if pd.api.types.is_integer_dtype(df[col]) else f'"{col}"'
+                            for col in df.columns
+                        )
+                        self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+                        self._conn.execute(f'CREATE TABLE "{table}" ({column_defs})')
+                        self._create_indexes(table)
+                    self._conn.execute(f'DELETE FROM "{table}"')
+                    if not df.empty:
+                        column_list = ', '.join(f'"{col}"' for col in df.columns)
+                        placeholders = ', '.join('?' for _ in df.columns)
+                        self._conn.executemany(
+                            f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})',
+                            ([_to_python(value) for value in row] for row in df.itertuples(index=False))
+                        )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            for table in frames:
+                self._changed(table)
+
+    def append(self, table, row):
+        """Append a single row to a table"""
+        row = coerce_row(table, row)
+        with self.lock(table), self._lock, self._conn:
+            self._insert(table, row)
+
+    def _insert(self, table, row):
+        columns = [col for col in self._columns(table) if col in row]
+        placeholders = ', '.join('?' for _ in columns)
+        column_list = ', '.join(f'"{col}"' for col in columns)
+        self._conn.execute(
+            f'INSERT INTO "{table}" ({column_list}) VALUES ({placeholders})',
+            [_to_python(row[col]) for col in columns]
+        )
+        self._changed(table)
+
+    def get_by_id(self, table, record_id):
+        """Return one record as a dict, or None if no row has that id"""
+        df = self.select(table, id=record_id)
+        return None if df.empty else df.iloc[0].to_dict()
+
+    def delete_by_id(self, table, record_id):
+        """Delete the row with the given id and return how many were removed"""
+        return self.delete_where(table, id=record_id)
+
+    def update_by_id(self, table, record_id, values):
+        """Set column values on the row with the given id and return the row count"""
+        return self.update_where(table, values, id=record_id)
+
+    def delete_where(self, table, **criteria):
+        """Delete rows matching the criteria and return how many were removed"""
+        with self.lock(table), self._lock, self._conn:
+            return self._delete(table, criteria)
+
+    def _delete(self, table, criteria):
+        clause, params = self._where(criteria)
+        cursor = self._conn.execute(f'DELETE FROM "{table}" WHERE {clause}', params)
+        self._changed(table)
+        return cursor.rowcount
+
+    def update_where(self, table, values, **criteria):
+        """Set column values on rows matching the criteria and return the row count"""
+        values = coerce_row(table, values)
+        with self.lock(table), self._lock, self._conn:
+            return self._update(table, values, criteria)
+
+    def _update(self, table, values, criteria):
+        clause, params = self._where(criteria)
+        assignments = ', '.join(f'"{column}" = ?' for column in values)
+        cursor = self._conn.execute(
+            f'UPDATE "{table}" SET {assignments} WHERE {clause}',
+            [_to_python(value) for value in values.values()] + params
+        )
+        self._changed(table)
+        return cursor.rowcount
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def import_csv(self, tables=None):
+        """Load tables from their CSV mirrors, replacing the database contents"""
+        for table in tables or TABLE_COLUMNS:
+            path = self.csv_path(table)
+            if not os.path.exists(path):
+                continue
+            try:
+                df = pd.read_csv(path)
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=TABLE_COLUMNS.get(table, []))
+            self.write(table, df)
+            self._remember_csv(table)
+            logger.info("Imported %d rows into %s from %s", len(df), table, path)
+        return True
+
+    def _remember_csv(self, table):
+        signature = self._signature(self.csv_path(table))
+        if signature is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO "_csv_mirror" (tbl, mtime_ns, size) VALUES (?, ?, ?)',
+                (table, signature[0], signature[1])
+            )
+
+    def reload_from_csv(self):
+        """Re-import CSV mirrors that changed on disk since the last export/import"""
+        with self._lock:
+            known = {
+                row[0]: (row[1], row[2])
+                for row in self._conn.execute('SELECT tbl, mtime_ns, size FROM "_csv_mirror"')
+            }
+        changed = [
+            table for table in TABLE_COLUMNS
+            if self._signature(self.csv_path(table)) not in (None, known.get(table))
+        ]
+        if changed:
+            self.import_csv(changed)
+        return True
+
+    def export_csv(self):
+        """Write every table to its CSV mirror for git sync"""
+        # All locks, so the mirrors never show half of a transaction
+        with self.lock(*TABLE_COLUMNS), self._lock:
+            for table in TABLE_COLUMNS:
+                if not self._columns(table):
+                    continue
+                df = self.read(table)
+                atomic_write(self.csv_path(table), lambda f: df.to_csv(f, index=False, date_format=DATE_FORMAT))
+                self._remember_csv(table)
+        return True
+
+    def stats(self):
+        """Get table cache hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'cached_tables': len(self._cache)
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_csv_to_sqlite(data_dir, db_path=None):
+    """One-shot migration of the CSV files in data_dir into a SQLite database"""
+    storage = SqliteStorage(data_dir, db_path)
+    storage.import_csv()
+    for table, columns in TABLE_COLUMNS.items():
+        storage.ensure_table(table, columns)
+    return storage
+
+
+def open_storage(data_dir, backend=None):
+    """Open the storage backend selected by FC_STORAGE_BACKEND (csv or sqlite)"""
+    backend = (backend or os.environ.get('FC_STORAGE_BACKEND', 'csv')).lower()
+    if backend == 'sqlite':
+        db_path = os.path.join(data_dir, "fc_data.db")
+        if not os.path.exists(db_path):
+            logger.info("Migrating CSV data into %s", db_path)
+            return migrate_csv_to_sqlite(data_dir, db_path)
+        return SqliteStorage(data_dir, db_path)
+    if backend != 'csv':
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return CsvStorage(data_dir)
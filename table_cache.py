@@ -0,0 +1,209 @@
+import csv
+import io
+import os
+import threading
+import pandas as pd
+from table_lock import atomic_write
+
+
+class TableCache:
+    """In-process cache of CSV tables, invalidated by file mtime/size
+
+    prepare(path, df) is applied to every parsed frame (e.g. to set dtypes)
+    and date_format is passed to to_csv when writing. With a SnapshotStore,
+    tables are loaded from their columnar snapshot while it is fresh and
+    the snapshot is rebuilt whenever a changed CSV has to be parsed.
+    """
+
+    def __init__(self, prepare=None, date_format=None, snapshots=None):
+        self._prepare = prepare or (lambda path, df: df)
+        self._date_format = date_format
+        self._snapshots = snapshots
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(path):
+        """Return the (inode, mtime, size) signature of a file, or None if missing"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # Writes replace the file, so a new inode also marks a change
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def read(self, path):
+        """Return a copy of the table at path, parsing the CSV only when it changed"""
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and signature is not None and entry[0] == signature:
+                self.hits += 1
+                return self._materialize(path, entry).copy()
+            self.misses += 1
+
+        df = self._load(path, signature)
+        with self._lock:
+            self._entries[path] = (signature, df, [])
+        return df.copy()
+
+    def _load(self, path, signature):
+        """Parse a table, from its snapshot if that still matches the CSV"""
+        if self._snapshots is not None:
+            df = self._snapshots.load(path, signature)
+            if df is not None:
+                return self._prepare(path, df)
+        df = self._prepare(path, pd.read_csv(path))
+        if self._snapshots is not None:
+            self._snapshots.save(path, signature, df)
+        return df
+
+    def read_columns(self, path, columns):
+        """Return a copy of some columns of a table
+
+        A cold read takes just those columns from a fresh snapshot instead
+        of parsing the whole CSV; the result isn't cached.
+        """
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and signature is not None and entry[0] == signature:
+                self.hits += 1
+                return self._materialize(path, entry)[columns].copy()
+        if self._snapshots is not None:
+            df = self._snapshots.load(path, signature, columns)
+            if df is not None:
+                with self._lock:
+                    self.misses += 1
+                return self._prepare(path, df)
+        return self.read(path)[columns]
+
+    def peek(self, path):
+        """Return the cached table itself, without copying; callers must not modify it"""
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and signature is not None and entry[0] == signature:
+                self.hits += 1
+                return self._materialize(path, entry)
+        self.read(path)
+        with self._lock:
+            return self._materialize(path, self._entries[path])
+
+    def _materialize(self, path, entry):
+        """Fold rows appended since the last read into the cached frame"""
+        signature, df, pending = entry
+        if pending:
+            header = io.StringIO()
+            csv.writer(header, lineterminator='\n').writerow(df.columns)
+            appended = pd.read_csv(io.StringIO(header.getvalue() + ''.join(pending)))
+            if df.empty:
+                df = appended
+            else:
+                # All-NA columns (e.g. blank notes) would make pandas guess the
+                # column dtype, which is deprecated; concat fills them back in
+                df = pd.concat([df, appended.dropna(axis=1, how='all')], ignore_index=True)
+            # Concatenating categoricals with new values falls back to object
+            df = self._prepare(path, df)
+            self._entries[path] = (signature, df, [])
+        return df
+
+    def write(self, path, df):
+        """Write a table to disk atomically and keep the cached copy in sync"""
+        atomic_write(path, lambda f: self.to_csv(df, f))
+        self._remember(path, df)
+
+    def to_csv(self, df, f):
+        """Write a frame the way this cache writes its files"""
+        df.to_csv(f, index=False, date_format=self._date_format)
+
+    def install(self, path, source_path, df):
+        """Move an already written file into place at path and cache df as its contents"""
+        os.replace(source_path, path)
+        self._remember(path, df)
+
+    def _remember(self, path, df):
+        signature = self.signature(path)
+        with self._lock:
+            self._entries[path] = (signature, df.copy(), [])
+        # Writing the snapshot is cheap next to the CSV; appends leave it
+        # stale until the next parse instead
+        if self._snapshots is not None:
+            self._snapshots.save(path, signature, df)
+
+    def append(self, path, row):
+        """Append a single row to the end of a CSV file without rewriting it
+
+        Only the new row is written (and fsynced), so the cost does not
+        depend on the size of the table. Values are quoted the same way
+        pandas quotes them, which keeps multi-line member names intact.
+        """
+        with self._lock:
+            signature = self.signature(path)
+            entry = self._entries.get(path)
+            fresh = entry is not None and signature is not None and entry[0] == signature
+            columns = list(entry[1].columns) if fresh else self._read_header(path)
+
+            line = io.StringIO()
+            csv.writer(line, lineterminator='\n').writerow(
+                ['' if pd.isna(row.get(col)) else row.get(col) for col in columns]
+            )
+            line = line.getvalue()
+
+            with open(path, 'a+b') as f:
+                # pandas always ends files with a newline, but guard against
+                # hand-edited files so the new row starts on its own line
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+
+            if fresh:
+                entry[2].append(line)
+                self._entries[path] = (self.signature(path), entry[1], entry[2])
+            else:
+                self._entries.pop(path, None)
+
+    def row_count(self, path):
+        """Return the number of rows in a table without copying it"""
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and signature is not None and entry[0] == signature:
+                self.hits += 1
+                return len(entry[1]) + len(entry[2])
+        return len(self.read(path))
+
+    @staticmethod
+    def _read_header(path):
+        """Read just the header row of a CSV file"""
+        with open(path, newline='', encoding='utf-8') as f:
+            return next(csv.reader(f), [])
+
+    def invalidate(self, path=None):
+        """Drop one cached table, or all of them"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self):
+        """Return cache hit/miss counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'cached_tables': len(self._entries)
+            }
+        if self._snapshots is not None:
+            stats.update(self._snapshots.stats())
+        return stats
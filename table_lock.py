@@ -0,0 +1,109 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; fall back to in-process locking only
+    fcntl = None
+
+
+class TableLock:
+    """Re-entrant lock on one table, shared by threads and by processes
+
+    Threads of this process serialize on an RLock; the outermost holder
+    also takes an exclusive fcntl lock on a sidecar lock file so other
+    processes (e.g. another Streamlit server) wait as well.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        """Take the lock; with blocking=False, return False instead of waiting"""
+        if not self._lock.acquire(blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            fd = None
+            try:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                self._lock.release()
+                return False
+            except BaseException:
+                if fd is not None:
+                    os.close(fd)
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class TableLocks:
+    """One TableLock per table, with lock files kept in a directory"""
+
+    def __init__(self, lock_dir):
+        self.lock_dir = lock_dir
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, table):
+        with self._guard:
+            lock = self._locks.get(table)
+            if lock is None:
+                lock = self._locks[table] = TableLock(os.path.join(self.lock_dir, f"{table}.lock"))
+            return lock
+
+    @contextmanager
+    def hold(self, *tables):
+        """Hold the locks of several tables, always taken in name order"""
+        locks = [self.get(table) for table in sorted(set(tables))]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+def atomic_write(path, write):
+    """Write a file via write(file_object) into a temp file, then rename it over path
+
+    Readers see either the old or the new file, never a partial one.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
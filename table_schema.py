@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# Dates are stored as plain YYYY-MM-DD text in CSV files and SQLite
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def _string_dtype():
+    """pandas' string dtype with NaN for missing values, backed by pyarrow when installed"""
+    try:
+        return pd.StringDtype(na_value=np.nan)
+    except TypeError:  # pandas < 2.3 has no NaN-variant string dtype
+        pass
+    try:
+        # pandas 2.1-2.2 spell the same dtype as a storage name; it needs pyarrow
+        return pd.StringDtype("pyarrow_numpy")
+    except (ImportError, ValueError):
+        return object
+
+
+STRING = _string_dtype()
+INTEGER = 'int64'
+CATEGORY = 'category'
+DATE = 'datetime64'
+
+# Column dtypes of every ledger table; columns not listed are left as read
+TABLE_DTYPES = {
+    'members': {
+        'id': STRING, 'member_id': INTEGER, 'name': STRING, 'world': CATEGORY, 'join_date': DATE,
+        'left_date': DATE,
+    },
+    'donations': {
+        'id': STRING, 'member_id': INTEGER, 'amount': INTEGER, 'date': DATE, 'notes': STRING,
+        'timestamp': STRING,
+    },
+    'expenses': {
+        'id': STRING, 'date': DATE, 'amount': INTEGER, 'description': STRING, 'category': CATEGORY,
+        'approved_by_id': INTEGER, 'recipient_id': INTEGER, 'timestamp': STRING, 'status': CATEGORY,
+        'returned_amount': INTEGER, 'returned_date': DATE,
+    },
+    'bids': {
+        'id': STRING, 'member_id': INTEGER, 'bid_number': INTEGER, 'date': DATE,
+    },
+}
+
+
+def _to_integer(series, strict):
+    numbers = pd.to_numeric(series, errors='raise' if strict else 'coerce')
+    present = numbers.dropna()
+    if (present != np.floor(present)).any():
+        if strict:
+            raise ValueError("gil amounts must be whole numbers")
+        return numbers
+    # Missing amounts need the nullable integer dtype
+    return numbers.astype('Int64' if len(present) < len(numbers) else INTEGER)
+
+
+def _to_date(series, strict):
+    try:
+        return pd.to_datetime(series, format=DATE_FORMAT)
+    except (TypeError, ValueError):
+        pass
+    # Hand-edited files may use other layouts; normalize them on write
+    if strict:
+        return pd.to_datetime(series, format='mixed').dt.normalize()
+    dates = pd.to_datetime(series, format='mixed', errors='coerce').dt.normalize()
+    unreadable = series[dates.isna() & series.notna()]
+    if len(unreadable):
+        # Keep the column a date column; only the bad rows are left empty
+        logger.warning("Column %s has %d unreadable date(s), left empty: %s",
+                       series.name, len(unreadable), unreadable.head(5).tolist())
+    return dates
+
+
+def _convert(series, dtype, strict):
+    # Frames loaded from a snapshot or the cache usually have their dtypes already
+    if dtype == INTEGER:
+        return series if series.dtype == INTEGER else _to_integer(series, strict)
+    if dtype == DATE:
+        return series if pd.api.types.is_datetime64_any_dtype(series) else _to_date(series, strict)
+    if dtype == CATEGORY:
+        if isinstance(series.dtype, pd.CategoricalDtype) and series.dtype.categories.dtype == STRING:
+            return series
+        return series.astype(STRING).astype(CATEGORY)
+    return series.astype(dtype)
+
+
+def apply_schema(table, df, strict=False):
+    """Convert the columns of a table to their schema dtypes
+
+    Reads are lenient: a column that doesn't convert is kept as read and a
+    warning is logged. With strict=True (writes) a bad value raises
+    ValueError instead, so it never reaches the files.
+    """
+    dtypes = TABLE_DTYPES.get(table)
+    if not dtypes:
+        return df
+    df = df.copy()
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        try:
+            df[column] = _convert(df[column], dtype, strict)
+        except (TypeError, ValueError) as e:
+            if strict:
+                raise ValueError(f"{table}.{column}: {e}") from e
+            logger.warning("Could not convert %s.%s to %s: %s", table, column, dtype, e)
+    return df
+
+
+def to_stored(table, df):
+    """Return df with plain Python-friendly columns for SQLite: dates as text, no categoricals"""
+    dtypes = TABLE_DTYPES.get(table, {})
+    df = df.copy()
+    for column in df.columns:
+        series = df[column]
+        if dtypes.get(column) == DATE and pd.api.types.is_datetime64_any_dtype(series):
+            df[column] = series.dt.strftime(DATE_FORMAT).astype(object).where(series.notna(), None)
+        elif not isinstance(series.dtype, np.dtype):
+            # categorical, string and nullable integer columns
+            df[column] = series.astype(object).where(series.notna(), None)
+    return df
+
+
+def coerce_row(table, row):
+    """Check a single new row against the schema and return it in stored form
+
+    Amounts must be whole numbers and dates are written as YYYY-MM-DD.
+    """
+    dtypes = TABLE_DTYPES.get(table, {})
+    stored = dict(row)
+    for column, value in row.items():
+        if value is None or pd.isna(value):
+            continue
+        if dtypes.get(column) == INTEGER:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{table}.{column}: expected a number, got {value!r}")
+            if not number.is_integer():
+                raise ValueError(f"{table}.{column}: gil amounts must be whole numbers")
+            stored[column] = int(number)
+        elif dtypes.get(column) == DATE:
+            stored[column] = pd.Timestamp(value).strftime(DATE_FORMAT)
+    return stored
+
+
+def format_date(value):
+    """Format a schema date for display; missing dates become an empty string"""
+    if value is None or pd.isna(value):
+        return ''
+    return pd.Timestamp(value).strftime(DATE_FORMAT)
+
+
+if __name__ == "__main__":
+    # Memory benchmark: python table_schema.py [rows]
+    import io
+    import sys
+    import time
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 1000, rows), unit='D')
+    source = pd.DataFrame({
+        'id': [f"01J{i:023d}" for i in range(rows)],
+        'member_id': rng.integers(1, 301, rows),
+        'amount': rng.integers(1, 50, rows) * 100_000,
+        'date': dates.strftime(DATE_FORMAT),
+        'notes': np.where(rng.random(rows) < 0.1, 'for the house', None),
+        'timestamp': dates.strftime('%Y-%m-%d') + '_120000',
+    })
+    buffer = io.StringIO()
+    source.to_csv(buffer, index=False)
+    text = buffer.getvalue()
+
+    # Untyped: every text column as Python objects, the way tables were read before
+    untyped = pd.read_csv(io.StringIO(text), dtype={
+        column: object for column in ('id', 'date', 'notes', 'timestamp')
+    })
+    start = time.perf_counter()
+    typed = apply_schema('donations', pd.read_csv(io.StringIO(text)))
+    elapsed = time.perf_counter() - start
+
+    before = untyped.memory_usage(deep=True, index=False)
+    after = typed.memory_usage(deep=True, index=False)
+    print(f"{rows:,} donation rows, read + schema in {elapsed:.2f}s (string dtype: {STRING})")
+    print(f"{'column':<12} {'untyped MB':>11} {'typed MB':>9}  dtype")
+    for column in source.columns:
+        print(f"{column:<12} {before[column] / 2**20:>11.1f} {after[column] / 2**20:>9.1f}  {typed[column].dtype}")
+    print(f"{'total':<12} {before.sum() / 2**20:>11.1f} {after.sum() / 2**20:>9.1f}  "
+          f"({1 - after.sum() / before.sum():.0%} smaller)")
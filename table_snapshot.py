@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+from log_config import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # optional; without pyarrow every cold read parses the CSV
+    pa = None
+
+logger = get_logger(__name__)
+
+# Snapshot files live in this folder of the data directory (not synced to git)
+SNAPSHOT_DIR = "snapshots"
+
+# Schema metadata key holding the signature of the CSV a snapshot was built from
+SOURCE_KEY = b'fc_source_signature'
+
+
+class SnapshotStore:
+    """Columnar Arrow IPC (Feather v2) copies of CSV tables
+
+    The CSV files stay the source of truth. A snapshot records the
+    signature of the CSV it was built from and is only used while that
+    signature still matches, so any change to the CSV (a write, an append,
+    a git pull) makes it stale until the next parse rebuilds it. Snapshots
+    are written uncompressed so they can be memory-mapped, and a read can
+    load just some of the columns.
+    """
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = snapshot_dir
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rebuilds = 0
+
+    @staticmethod
+    def available():
+        """Whether pyarrow is installed"""
+        return pa is not None
+
+    def path(self, source_path):
+        """Return the snapshot path of a CSV file"""
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(self.snapshot_dir, f"{name}.arrow")
+
+    def load(self, source_path, signature, columns=None):
+        """Return the snapshot of a CSV as a DataFrame, or None if it's missing or stale"""
+        if signature is None:
+            return None
+        try:
+            with pa.memory_map(self.path(source_path)) as source:
+                reader = pa.ipc.open_file(source)
+                metadata = reader.schema.metadata or {}
+                if json.loads(metadata.get(SOURCE_KEY, b'null')) != list(signature):
+                    return None
+                table = reader.read_all()
+        except FileNotFoundError:
+            return None
+        except (pa.ArrowInvalid, OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable snapshot of %s: %s", source_path, e)
+            return None
+        if columns is not None:
+            table = table.select(columns)
+        with self._lock:
+            self.hits += 1
+        return table.to_pandas()
+
+    def save(self, source_path, signature, df):
+        """Write a snapshot of df, the parsed contents of the CSV with the given signature"""
+        if signature is None:
+            return
+        path = self.path(source_path)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata(
+                {**(table.schema.metadata or {}), SOURCE_KEY: json.dumps(list(signature)).encode()}
+            )
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, path)
+        except (pa.ArrowException, OSError) as e:
+            # A missing snapshot only costs a CSV parse, so never fail the read
+            logger.warning("Could not write snapshot of %s: %s", source_path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self.rebuilds += 1
+        logger.debug("Rebuilt snapshot %s (%d rows)", path, len(df))
+
+    def stats(self):
+        """Return snapshot hit/rebuild counters"""
+        with self._lock:
+            return {'snapshot_hits': self.hits, 'snapshot_rebuilds': self.rebuilds}
+
+
+def open_snapshots(data_dir):
+    """Return a SnapshotStore for data_dir, or None when pyarrow isn't installed"""
+    if not SnapshotStore.available():
+        return None
+    return SnapshotStore(os.path.join(data_dir, SNAPSHOT_DIR))
+
+
+if __name__ == "__main__":
+    # Cold-read benchmark: python table_snapshot.py [rows]
+    import sys
+    import tempfile
+    import time
+    import numpy as np
+    import pandas as pd
+    from table_cache import TableCache
+    from table_schema import DATE_FORMAT, apply_schema
+
+    if pa is None:
+        sys.exit("pyarrow is not installed")
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 1000, rows), unit='D')
+    source = pd.DataFrame({
+        'id': [f"01J{i:023d}" for i in range(rows)],
+        'member_id': rng.integers(1, 301, rows),
+        'amount': rng.integers(1, 50, rows) * 100_000,
+        'date': dates.strftime(DATE_FORMAT),
+        'notes': np.where(rng.random(rows) < 0.1, 'for the house', None),
+        'timestamp': dates.strftime('%Y-%m-%d') + '_120000',
+    })
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "donations.csv")
+        source.to_csv(path, index=False)
+        snapshots = SnapshotStore(os.path.join(data_dir, SNAPSHOT_DIR))
+
+        def cold(read):
+            # A new cache per run, like a fresh process
+            cache = TableCache(prepare=lambda path, df: apply_schema('donations', df), snapshots=snapshots)
+            start = time.perf_counter()
+            read(cache)
+            return time.perf_counter() - start
+
+        print(f"{rows:,} donation rows")
+        print(f"CSV parse + snapshot rebuild  {cold(lambda cache: cache.read(path)):6.2f}s")
+        print(f"snapshot, all columns         {cold(lambda cache: cache.read(path)):6.2f}s")
+        print(f"snapshot, amount only         {cold(lambda cache: cache.read_columns(path, ['amount'])):6.2f}s")
+        print(f"snapshot size {os.path.getsize(snapshots.path(path)) / 2**20:.1f} MB, "
+              f"CSV size {os.path.getsize(path) / 2**20:.1f} MB")
@@ -0,0 +1,60 @@
+"""Concurrent add_donation calls from many threads and two data managers
+
+Two DataManagers on the same data directory stand in for two server
+processes: each has its own table locks, ledger and donation index, and
+only the lock files and the data on disk are shared. Every thread also
+edits the notes of a seed donation, which rewrites the whole table, so
+a rewrite that doesn't hold the table lock loses appended rows.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from data_handler import DataManager
+
+THREADS = 8
+ROUNDS = 25
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def managers(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('REPL_HOME', str(tmp_path))
+    monkeypatch.setenv('FC_STORAGE_BACKEND', request.param)
+    first = DataManager()
+    first.storage.append('members', {
+        'id': 'member-1', 'member_id': 1, 'name': 'Stress Tester', 'world': 'Brynhildr',
+        'join_date': '2025-01-01', 'left_date': None
+    })
+    first.add_donation(1, 1, "seed")
+    second = DataManager()
+    yield first, second
+    for manager in (first, second):
+        manager.close()
+
+
+def test_add_donation_from_many_threads(managers):
+    seed_id = managers[0].storage.read('donations')['id'].iloc[0]
+
+    def work(worker):
+        manager = managers[worker % len(managers)]
+        results = []
+        for i in range(ROUNDS):
+            results.append(manager.add_donation(1, 100 + worker, f"worker {worker}"))
+            results.append(manager.update_donation_notes(seed_id, f"worker {worker} round {i}"))
+        return results
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = [ok for batch in executor.map(work, range(THREADS)) for ok in batch]
+
+    assert all(results)
+    expected_rows = THREADS * ROUNDS + 1
+    expected_total = 1 + sum((100 + worker) * ROUNDS for worker in range(THREADS))
+    for manager in managers:
+        manager.storage.reload_from_csv()
+        donations = manager.storage.read('donations')
+        assert len(donations) == expected_rows
+        assert donations['id'].is_unique
+        assert int(donations['amount'].sum()) == expected_total
+        assert manager.verify_totals() == {}
+        assert manager.get_total_fc_gil() == expected_total
+        assert manager.get_member_donation_summary(1)['total_amount'] == expected_total
@@ -0,0 +1,122 @@
+"""Backup snapshots: retention, garbage collection of shared objects and verified restores"""
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from backup_store import BackupStore
+
+FILES = ['members.csv', 'donations.csv']
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "data"
+    source.mkdir()
+    write(source, members="name\nAlpha\n", donations="member_id,amount\n1,100\n")
+    return source
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BackupStore(str(tmp_path / "backups"))
+
+
+def write(directory, **tables):
+    for table, content in tables.items():
+        (directory / f"{table}.csv").write_text(content)
+
+
+def object_files(store):
+    return {name for _, _, names in os.walk(store.objects_dir) for name in names}
+
+
+def test_prune_keeps_last_and_newest_per_hour_day_and_week(store, source):
+    created = {
+        'A': datetime(2025, 3, 12, 12, 10),
+        'B': datetime(2025, 3, 12, 12, 0),
+        'C': datetime(2025, 3, 12, 11, 0),
+        'D': datetime(2025, 3, 12, 10, 30),
+        'E': datetime(2025, 3, 12, 10, 0),
+        'F': datetime(2025, 3, 11, 20, 0),
+        'G': datetime(2025, 3, 11, 8, 0),
+        'H': datetime(2025, 3, 4, 15, 0),
+        'I': datetime(2025, 3, 4, 9, 0),
+        'J': datetime(2025, 2, 24, 10, 0),
+    }
+    names = {store.create(str(source), FILES, created=when): label for label, when in created.items()}
+
+    removed = store.prune(last=2, hourly=3, daily=2, weekly=2)
+
+    # last 2: A, B; hours 12/11/10: A, C, D; days 12th/11th: A, F; ISO weeks 11/10: A, H
+    assert sorted(names[name] for name in removed) == ['E', 'G', 'I', 'J']
+    assert sorted(names[manifest['name']] for manifest in store.list_snapshots()) == ['A', 'B', 'C', 'D', 'F', 'H']
+
+
+def test_prune_only_collects_objects_no_snapshot_references(store, source):
+    store.create(str(source), FILES, created=datetime(2025, 3, 1))
+    # members.csv is unchanged, so both snapshots share its object
+    write(source, donations="member_id,amount\n1,100\n1,250\n")
+    newest = store.create(str(source), FILES, created=datetime(2025, 3, 2))
+    assert len(object_files(store)) == 3
+
+    store.prune(last=1, hourly=0, daily=0, weekly=0)
+
+    manifest = store.snapshot(newest)
+    assert object_files(store) == {entry['sha256'] for entry in manifest['files'].values()}
+    assert store.verify(newest) == []
+
+
+def test_concurrent_backups_and_pruning_never_lose_objects(tmp_path):
+    # Two stores on one directory stand in for two server processes
+    stores = [BackupStore(str(tmp_path / "backups")) for _ in range(2)]
+    errors = []
+
+    def work(worker):
+        store = stores[worker]
+        try:
+            for i in range(15):
+                directory = tmp_path / f"worker{worker}"
+                directory.mkdir(exist_ok=True)
+                write(directory, members=f"name\nWorker {worker} round {i}\n", donations="member_id,amount\n")
+                store.create(str(directory), FILES)
+                store.prune(last=3, hourly=0, daily=0, weekly=0)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    for manifest in stores[0].list_snapshots():
+        assert stores[0].verify(manifest['name']) == []
+
+
+def test_restore_copies_the_snapshot_back(store, source):
+    name = store.create(str(source), FILES)
+    write(source, members="name\nChanged\n")
+
+    assert store.restore(name, str(source)) == sorted(FILES)
+    assert (source / "members.csv").read_text() == "name\nAlpha\n"
+
+
+@pytest.mark.parametrize('damage', ['corrupt', 'missing'])
+def test_restore_refuses_a_damaged_snapshot(store, source, damage):
+    name = store.create(str(source), FILES)
+    write(source, members="name\nCurrent\n")
+    object_path = store._object_path(store.snapshot(name)['files']['donations.csv']['sha256'])
+    if damage == 'corrupt':
+        with open(object_path, 'a') as f:
+            f.write("2,999\n")
+    else:
+        os.remove(object_path)
+
+    with pytest.raises(ValueError, match="failed verification"):
+        store.restore(name, str(source))
+    # Nothing is replaced unless every file verifies
+    assert (source / "members.csv").read_text() == "name\nCurrent\n"
+    assert not [path for path in os.listdir(source) if path.endswith('.restore')]
@@ -0,0 +1,106 @@
+"""Validation of import archives before any data is replaced"""
+import io
+import json
+import zipfile
+
+import pytest
+
+from data_archive import MANIFEST_NAME, ArchiveError, build_archive, read_archive
+from migrations import latest_version
+from record_ids import new_record_id
+
+MEMBER_IDS = [new_record_id() for _ in range(2)]
+
+
+def tables(**overrides):
+    """CSV contents of a small FC at the latest schema"""
+    first, second = MEMBER_IDS
+    csvs = {
+        'members': ("id,member_id,name,world,join_date,left_date\n"
+                    f"{first},1,Alpha,Brynhildr,2025-01-01,\n"
+                    f"{second},2,Beta,Mateus,2025-01-02,\n"),
+        'donations': ("id,member_id,amount,date,notes,timestamp\n"
+                      f"{new_record_id()},1,100,2025-01-03,,2025-01-03_000001\n"),
+        'expenses': ("id,date,amount,description,category,approved_by_id,recipient_id,timestamp,"
+                     "status,returned_amount,returned_date\n"
+                     f"{new_record_id()},2025-01-04,500,tent,Housing,1,2,2025-01-04_000001,spent,0,\n"),
+        'bids': ("id,member_id,bid_number,date\n"
+                 f"{new_record_id()},2,7,2025-01-05\n"),
+    }
+    csvs.update(overrides)
+    # One header line, then one row per line
+    return {table: (data.encode(), data.count('\n') - 1) for table, data in csvs.items()}
+
+
+def archive(tables, schema_version=None):
+    if schema_version is None:
+        schema_version = latest_version()
+    return io.BytesIO(build_archive(tables, schema_version, fc_id="1"))
+
+
+def rewrite(source, replace):
+    """Copy an archive, passing each (name, data) through replace; None drops the member"""
+    out = io.BytesIO()
+    with zipfile.ZipFile(source) as zin, zipfile.ZipFile(out, 'w') as zout:
+        for name in zin.namelist():
+            entry = replace(name, zin.read(name))
+            if entry is not None:
+                zout.writestr(*entry)
+    out.seek(0)
+    return out
+
+
+def test_reads_a_valid_archive():
+    frames, version = read_archive(archive(tables()))
+
+    assert version == latest_version()
+    assert frames['members']['name'].tolist() == ['Alpha', 'Beta']
+    assert len(frames['expenses']) == 1
+
+
+def test_rejects_a_file_that_does_not_match_its_checksum():
+    def tamper(name, data):
+        if name == 'donations.csv':
+            data = data.replace(b',100,', b',900,')
+        return name, data
+
+    with pytest.raises(ArchiveError, match="donations.csv does not match its checksum"):
+        read_archive(rewrite(archive(tables()), tamper))
+
+
+@pytest.mark.parametrize('renamed_to', [None, 'Bids.csv', 'data/bids.csv'])
+def test_rejects_a_missing_or_renamed_member_file(renamed_to):
+    def rename(name, data):
+        if name != 'bids.csv':
+            return name, data
+        return (renamed_to, data) if renamed_to else None
+
+    with pytest.raises(ArchiveError, match="missing required data files: bids.csv"):
+        read_archive(rewrite(archive(tables()), rename))
+
+
+def test_rejects_duplicate_record_ids():
+    record_id = new_record_id()
+    bids = ("id,member_id,bid_number,date\n"
+            f"{record_id},1,7,2025-01-05\n"
+            f"{record_id},2,8,2025-01-06\n")
+
+    with pytest.raises(ArchiveError, match="bids.csv has duplicate record ids"):
+        read_archive(archive(tables(bids=bids)))
+
+
+def test_rejects_an_archive_from_a_newer_schema():
+    with pytest.raises(ArchiveError, match="newer than this app supports"):
+        read_archive(archive(tables(), schema_version=latest_version() + 1))
+
+
+def test_rejects_a_manifest_row_count_that_does_not_match():
+    def miscount(name, data):
+        if name == MANIFEST_NAME:
+            manifest = json.loads(data)
+            manifest['files']['members.csv']['rows'] = 3
+            data = json.dumps(manifest)
+        return name, data
+
+    with pytest.raises(ArchiveError, match="members.csv has 2 rows, expected 3"):
+        read_archive(rewrite(archive(tables()), miscount))
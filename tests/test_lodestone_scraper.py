@@ -0,0 +1,157 @@
+"""LodestoneScraper against a local stand-in for the Lodestone roster pages
+
+The server serves the saved pages in tests/fixtures/lodestone with an
+ETag, answers If-None-Match with 304 and can be told to fail requests.
+"""
+import hashlib
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+import lodestone_scraper
+from lodestone_parser import available_backends
+from lodestone_scraper import LodestoneScraper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'lodestone')
+
+ROSTER = [
+    ("Martzia Droginovskya", "Brynhildr"),
+    ("Yayoi Shikibu", "Brynhildr"),
+    ("Alpha Tester", "Mateus"),
+    ("Beta Tester", "Zalera"),
+    ("Gamma Tester", "Brynhildr"),
+]
+
+
+class RosterHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        match = re.search(r"page=(\d+)", self.path)
+        page = int(match.group(1)) if match else 1
+        with server.lock:
+            server.requests.append((page, self.headers.get('If-None-Match')))
+            failing = server.failures.get(page, 0)
+            if failing:
+                server.failures[page] = failing - 1
+        if failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        with open(os.path.join(FIXTURES, server.pages[page]), 'rb') as f:
+            body = f.read()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RosterServer(http.server.ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RosterHandler)
+        self.lock = threading.Lock()
+        # page number -> fixture file
+        self.pages = {1: 'page1.html', 2: 'page2.html'}
+        # page number -> how many more requests get a 503
+        self.failures = {}
+        # (page, If-None-Match) of every request
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/lodestone/freecompany/1/member/"
+
+
+@pytest.fixture
+def server():
+    server = RosterServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping; the jitter always picks its upper bound"""
+    delays = []
+    monkeypatch.setattr(lodestone_scraper.time, 'sleep', delays.append)
+    monkeypatch.setattr(lodestone_scraper.random, 'uniform', lambda low, high: high)
+    return delays
+
+
+def scraper_for(server, **kwargs):
+    return LodestoneScraper("1", base_url=server.url, **kwargs)
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_parses_every_page_with_worlds(server, backend):
+    scraper = scraper_for(server, parser_backend=backend)
+    try:
+        assert scraper.get_all_members() == ROSTER
+    finally:
+        scraper.close()
+    assert sorted(page for page, _ in server.requests) == [1, 2]
+
+
+def test_unchanged_pages_are_revalidated_with_etags(server):
+    scraper = scraper_for(server)
+    try:
+        first = scraper.get_all_members()
+        server.requests.clear()
+        second = scraper.get_all_members()
+    finally:
+        scraper.close()
+
+    assert second == first == ROSTER
+    assert all(etag for _, etag in server.requests)
+    assert scraper.stats['not_modified'] == 2
+
+
+def test_retries_unavailable_pages_with_backoff(server, sleeps):
+    server.failures = {1: 2}
+    scraper = scraper_for(server, max_retries=3, backoff=0.5)
+    try:
+        assert scraper.get_all_members() == ROSTER
+    finally:
+        scraper.close()
+
+    assert [page for page, _ in server.requests].count(1) == 3
+    assert scraper.stats['retries'] == 2
+    assert sleeps == [0.5, 1.0]
+
+
+def test_gives_up_when_a_page_stays_unavailable(server, sleeps):
+    server.failures = {2: 3}
+    scraper = scraper_for(server, max_retries=3, backoff=0.5)
+    try:
+        assert scraper.get_all_members() == []
+    finally:
+        scraper.close()
+
+
+def test_empty_roster_page_fails_the_sync(server, sleeps):
+    # A maintenance page in place of page 2 would otherwise make everyone
+    # listed there look like they left the FC
+    server.pages[2] = 'maintenance.html'
+    scraper = scraper_for(server, max_retries=3, backoff=0.5)
+    try:
+        assert scraper.get_all_members() == []
+    finally:
+        scraper.close()
+
+    assert [page for page, _ in server.requests].count(2) == 3
@@ -0,0 +1,93 @@
+"""Schema migrations on a copy of the legacy data files in data/"""
+import glob
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from ledger import EXPENSE_PARTIALLY_RETURNED, EXPENSE_RETURNED
+from migrations import (SCHEMA_VERSION_FILE, _add_expense_status, latest_version, read_schema_version,
+                        run_migrations, write_schema_version)
+from record_ids import new_record_id
+from storage import TABLE_COLUMNS, open_storage
+
+LEGACY_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for path in glob.glob(os.path.join(LEGACY_DATA, '*.csv')):
+        shutil.copy(path, tmp_path)
+    return str(tmp_path)
+
+
+def migrate(data_dir, backend):
+    """Open the data directory as a fresh process would and migrate it"""
+    storage = open_storage(data_dir, backend)
+    try:
+        applied = run_migrations(storage, data_dir)
+        return applied, {table: storage.read(table) for table in TABLE_COLUMNS}
+    finally:
+        storage.close()
+
+
+def test_missing_version_file_does_not_migrate_again(data_dir, backend):
+    applied, migrated = migrate(data_dir, backend)
+    assert applied == list(range(1, latest_version() + 1))
+
+    # A clone of the synced data, or a copy without the version file
+    os.remove(os.path.join(data_dir, SCHEMA_VERSION_FILE))
+    applied, again = migrate(data_dir, backend)
+
+    assert applied == []
+    assert read_schema_version(data_dir) == latest_version()
+    for table in TABLE_COLUMNS:
+        pd.testing.assert_frame_equal(again[table], migrated[table])
+    expenses = again['expenses']
+    assert expenses['approved_by_id'].notna().all()
+    returned = expenses[expenses['description'] == 'for house']
+    assert returned['status'].tolist() == ['returned']
+    assert returned['returned_amount'].tolist() == [3000000]
+    assert again['members']['world'].notna().all()
+
+
+def test_expense_status_only_fills_rows_without_one(data_dir, backend):
+    migrate(data_dir, backend)
+    storage = open_storage(data_dir, backend)
+    try:
+        first = storage.read('expenses')['id'].iloc[0]
+        storage.update_by_id('expenses', first, {'status': EXPENSE_PARTIALLY_RETURNED, 'returned_amount': 1000,
+                                                 'returned_date': '2025-04-01'})
+        storage.append('expenses', {'id': new_record_id(), 'date': '2025-04-02', 'amount': 500,
+                                    'description': 'tent (Gil Returned)', 'category': 'Housing',
+                                    'timestamp': '2025-04-02_000000'})
+        before = storage.read('expenses')
+
+        _add_expense_status(storage)
+        after = storage.read('expenses')
+    finally:
+        storage.close()
+
+    pd.testing.assert_frame_equal(after.iloc[:-1], before.iloc[:-1], check_dtype=False)
+    kept = after.iloc[0]
+    assert (kept['status'], kept['returned_amount']) == (EXPENSE_PARTIALLY_RETURNED, 1000)
+    assert kept['returned_date'] == pd.Timestamp('2025-04-01')
+    added = after.iloc[-1]
+    assert (added['status'], added['returned_amount'], added['description']) == (EXPENSE_RETURNED, 500, 'tent')
+
+
+def test_rerunning_every_migration_keeps_migrated_data(data_dir, backend):
+    _, migrated = migrate(data_dir, backend)
+
+    write_schema_version(data_dir, 0)
+    applied, again = migrate(data_dir, backend)
+
+    assert applied == list(range(1, latest_version() + 1))
+    for table in TABLE_COLUMNS:
+        pd.testing.assert_frame_equal(again[table], migrated[table])
@@ -0,0 +1,114 @@
+"""Multi-table transactions that crash part way through, on both backends
+
+The crashing side runs in a forked child that exits with os._exit, so no
+cleanup (rollback, finally blocks, lock release) runs; the parent then
+opens the data directory the way a restarted server would.
+"""
+import multiprocessing
+import os
+
+import pytest
+
+from record_ids import new_record_id
+from storage import TABLE_COLUMNS, open_storage
+
+CRASHED = 3
+TABLES = ('members', 'bids', 'donations')
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def data_dir(tmp_path, backend):
+    storage = open_storage(str(tmp_path), backend)
+    for table, columns in TABLE_COLUMNS.items():
+        storage.ensure_table(table, columns)
+    for member_id in (1, 2):
+        storage.append('members', {'id': new_record_id(), 'member_id': member_id, 'name': f"Member {member_id}",
+                                   'world': 'Brynhildr', 'join_date': '2025-01-01'})
+        storage.append('bids', {'id': new_record_id(), 'member_id': member_id, 'bid_number': member_id,
+                                'date': '2025-01-02'})
+        storage.append('donations', {'id': new_record_id(), 'member_id': member_id, 'amount': 100,
+                                     'date': '2025-01-03', 'timestamp': f"2025-01-03_00{member_id}"})
+    storage.close()
+    return str(tmp_path)
+
+
+def run_and_crash(func):
+    """Run func in a child process that is expected to die with CRASHED"""
+    process = multiprocessing.get_context('fork').Process(target=func)
+    process.start()
+    process.join(30)
+    assert process.exitcode == CRASHED
+
+
+def member_ids(data_dir, backend):
+    """member_ids left in each table after a restart"""
+    storage = open_storage(data_dir, backend)
+    try:
+        storage.reload_from_csv()
+        return {table: sorted(storage.read(table)['member_id'].tolist()) for table in TABLES}
+    finally:
+        storage.close()
+
+
+def delete_member(storage, member_id, crash_before=None):
+    with storage.transaction(*TABLES) as txn:
+        for table in TABLES:
+            if table == crash_before:
+                os._exit(CRASHED)
+            txn.delete_where(table, member_id=member_id)
+
+
+def test_crash_between_tables_rolls_back(data_dir, backend):
+    run_and_crash(lambda: delete_member(open_storage(data_dir, backend), 1, crash_before='donations'))
+
+    assert member_ids(data_dir, backend) == {table: [1, 2] for table in TABLES}
+
+
+def test_crash_while_replacing_csv_files_rolls_forward(data_dir, backend):
+    if backend != 'csv':
+        pytest.skip("SQLite commits all tables with a single COMMIT")
+
+    def crash_after_first_file():
+        storage = open_storage(data_dir, backend)
+        install = storage.cache.install
+        installed = []
+
+        def install_then_crash(*args):
+            if installed:
+                os._exit(CRASHED)
+            installed.append(install(*args))
+        storage.cache.install = install_then_crash
+        delete_member(storage, 1)
+    run_and_crash(crash_after_first_file)
+
+    assert member_ids(data_dir, backend) == {table: [2] for table in TABLES}
+
+
+def test_committed_transaction(data_dir, backend):
+    storage = open_storage(data_dir, backend)
+    try:
+        delete_member(storage, 1)
+    finally:
+        storage.close()
+
+    assert member_ids(data_dir, backend) == {table: [2] for table in TABLES}
+
+
+def test_sqlite_transaction_only_touches_matching_rows(data_dir, backend):
+    if backend != 'sqlite':
+        pytest.skip("CSV tables are always rewritten whole")
+    storage = open_storage(data_dir, backend)
+    try:
+        rows = {table: storage._conn.execute(f'SELECT rowid, id FROM "{table}" WHERE member_id = 2').fetchall()
+                for table in TABLES}
+        delete_member(storage, 1)
+        # A rewritten table would have renumbered the rows that were kept
+        for table in TABLES:
+            assert storage._conn.execute(f'SELECT rowid, id FROM "{table}"').fetchall() == rows[table]
+    finally:
+        storage.close()